@@ -1,15 +1,51 @@
 from django.contrib import admin
-from .models import Event
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from .models import Event, Resource, Availability, Reminder
+from .search import index_available, match_expression, matching_ids_sql
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ('name', 'created_by', 'start', 'end', 'is_approved', 'approved_at')
-    list_filter = ('is_approved', 'start')
-    search_fields = ('name', 'created_by__username')
+    list_display = ('name', 'created_by', 'resource', 'start', 'end', 'is_approved', 'approved_at', 'priority')
+    list_filter = ('is_approved', 'resource', 'start')
+    search_fields = ('name', 'description', 'created_by__username')
     ordering = ('-start',)
     actions = ['approve_selected_events']
 
+    def get_search_results(self, request, queryset, search_term):
+        # Use the FTS5 index for title/description instead of LIKE '%…%' scans
+        if not search_term or not index_available() or not match_expression(search_term):
+            return super().get_search_results(request, queryset, search_term)
+        queryset = queryset.filter(
+            Q(id__in=RawSQL(*matching_ids_sql(search_term)))
+            | Q(created_by__username__icontains=search_term)
+        )
+        return queryset, False
+
     @admin.action(description="Approve selected events")
     def approve_selected_events(self, request, queryset):
-        count = queryset.update(is_approved=True, approved_at=None)
+        count = queryset.update(is_approved=True, approved_at=None, version=F("version") + 1)
         self.message_user(request, f"{count} event(s) approved successfully.")
+
+
+@admin.register(Resource)
+class ResourceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'is_active')
+    list_filter = ('is_active',)
+    search_fields = ('name',)
+
+
+@admin.register(Availability)
+class AvailabilityAdmin(admin.ModelAdmin):
+    list_display = ('resource', 'weekday', 'start_time', 'end_time')
+    list_filter = ('resource', 'weekday')
+
+
+
+@admin.register(Reminder)
+class ReminderAdmin(admin.ModelAdmin):
+    list_display = ('event', 'offset', 'due_at', 'status', 'attempts', 'sent_at')
+    list_filter = ('status',)
+    list_select_related = ('event',)
+    raw_id_fields = ('event',)
+    ordering = ('-due_at',)
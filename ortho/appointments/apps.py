@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def restore_search_index(sender, using, **kwargs):
+    # Table rebuilds in later SQLite migrations drop the FTS triggers
+    from django.db import connections
+    from .search import ensure_index
+    ensure_index(connections[using])
 
 
 class AppointmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appointments'
+
+    def ready(self):
+        post_migrate.connect(restore_search_index, sender=self)
@@ -0,0 +1,127 @@
+"""
+Serialisation of the calendar event feed.
+
+The default format is FullCalendar's list of event objects. Clients can opt
+into a compact columnar format with ``?format=compact`` or
+``Accept: application/vnd.ortho.events+json``: one array per field, start/end
+as epoch seconds, and repeated strings (status colours, creator names)
+replaced by indexes into small lookup tables. The calendar templates decode
+it with ``decodeCompactEvents`` (templates/appointments/compact_feed.html).
+"""
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:  # in requirements.txt; stdlib fallback for bare installs
+    orjson = None
+    import json
+
+COMPACT_MEDIA_TYPE = "application/vnd.ortho.events+json"
+
+APPROVED_COLOR = "#198754"
+PENDING_COLOR = "#ffc107"
+
+# Index 0 = pending, 1 = approved
+STATUSES = [
+    {"isApproved": False, "color": PENDING_COLOR},
+    {"isApproved": True, "color": APPROVED_COLOR},
+]
+
+
+def wants_compact(request):
+    if request.GET.get("format") == "compact":
+        return True
+    return COMPACT_MEDIA_TYPE in request.headers.get("Accept", "")
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+
+def json_response(data, content_type="application/json", status=200):
+    response = HttpResponse(dumps(data), content_type=content_type, status=status)
+    response["Vary"] = "Accept"
+    return response
+
+
+def is_private(ev, user):
+    """Other clients' approved events are shown only as a booked slot."""
+    return not user.is_staff and ev.is_approved and ev.created_by_id != user.id
+
+
+def creator_name(ev):
+    return ev.created_by.get_full_name() or ev.created_by.username
+
+
+def legacy_events(events, user):
+    data = []
+    for ev in events:
+        bg = APPROVED_COLOR if ev.is_approved else PENDING_COLOR
+        item = {
+            "id": ev.id,
+            "start": ev.start.isoformat(),
+            "end": ev.end.isoformat(),
+            "isApproved": ev.is_approved,
+            "resourceId": ev.resource_id,
+            "backgroundColor": bg,
+            "borderColor": bg,
+        }
+        if is_private(ev, user):
+            # Show only that the slot is booked
+            item["title"] = "Booked"
+            item["description"] = ""
+            item["extendedProps"] = {"isOwnEvent": False, "version": ev.version}
+        else:
+            item["title"] = ev.name
+            item["description"] = ev.description or ""
+            item["extendedProps"] = {
+                "isOwnEvent": ev.created_by_id == user.id,
+                "createdBy": creator_name(ev),
+                "version": ev.version,
+            }
+        data.append(item)
+    return data
+
+
+def compact_events(events, user):
+    creators = []
+    creator_index = {}
+    columns = {
+        "id": [], "title": [], "start": [], "end": [], "description": [],
+        "status": [], "creator": [], "own": [], "resourceId": [], "version": [],
+    }
+    for ev in events:
+        private = is_private(ev, user)
+        if private:
+            creator = -1
+        else:
+            creator = creator_index.get(ev.created_by_id)
+            if creator is None:
+                creator = creator_index[ev.created_by_id] = len(creators)
+                creators.append(creator_name(ev))
+        columns["id"].append(ev.id)
+        columns["title"].append("Booked" if private else ev.name)
+        columns["start"].append(int(ev.start.timestamp()))
+        columns["end"].append(int(ev.end.timestamp()))
+        columns["description"].append("" if private else ev.description or "")
+        columns["status"].append(1 if ev.is_approved else 0)
+        columns["creator"].append(creator)
+        columns["own"].append(1 if ev.created_by_id == user.id else 0)
+        columns["resourceId"].append(ev.resource_id)
+        columns["version"].append(ev.version)
+
+    return {
+        "format": "compact/1",
+        "count": len(columns["id"]),
+        "statuses": STATUSES,
+        "creators": creators,
+        "columns": columns,
+    }
+
+
+def events_response(request, events):
+    if wants_compact(request):
+        return json_response(compact_events(events, request.user), content_type=COMPACT_MEDIA_TYPE)
+    return json_response(legacy_events(events, request.user))
@@ -0,0 +1,369 @@
+"""
+Bulk import of historical appointments from CSV or ICS files.
+
+Rows are parsed into lightweight tuples, clients and resources are resolved
+from dictionaries built with one query each, and the rows are sorted by
+(resource, start) so overlaps with each other and with already approved
+events are caught in a single sweep. Accepted rows are written with chunked
+``bulk_create`` calls, one transaction per chunk. After each chunk the
+number of rows written is saved to a checkpoint file, so an interrupted
+import can be resumed by running it again with the same options.
+"""
+import csv
+import hashlib
+import json
+import os
+import re
+from collections import Counter, namedtuple
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Event, Resource
+
+
+Row = namedtuple("Row", "line name start end description client resource approved")
+RowError = namedtuple("RowError", "line message")
+
+CSV_NAME_COLUMNS = ("name", "title")
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+# --------------------------------------------------------
+# Parsing
+# --------------------------------------------------------
+
+def get_zone(name):
+    """ZoneInfo for an IANA name; ValueError for anything else (e.g. Windows names)."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"unknown time zone {name!r}")
+
+
+def parse_timestamp(value, tz=None):
+    value = value.strip()
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        dt = parse_datetime(value)
+    if dt is None:
+        raise ValueError(f"invalid datetime {value!r}")
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, tz or timezone.get_default_timezone())
+    return dt
+
+
+def read_csv(stream):
+    """
+    Yield ``(line, fields)`` from a CSV with a header row. Recognised columns:
+    name/title, start, end, description, client (username or email),
+    resource (name), approved (1/0, true/false).
+    """
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None:
+        return
+    header = {h.strip().lower() for h in reader.fieldnames}
+    if not (header & set(CSV_NAME_COLUMNS)) or not {"start", "end", "client"} <= header:
+        raise ImportFormatError("CSV needs name/title, start, end and client columns")
+    for record in reader:
+        fields = {k.strip().lower(): (v or "").strip() for k, v in record.items() if k}
+        yield reader.line_num, fields
+
+
+_ICS_ESCAPES = re.compile(r"\\([\\;,nN])")
+
+
+def _ics_unescape(value):
+    return _ICS_ESCAPES.sub(lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def _ics_timestamp(params, value):
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        raise ValueError("all-day events are not supported")
+    utc = value.endswith("Z")
+    dt = datetime.strptime(value.rstrip("Z"), "%Y%m%dT%H%M%S")
+    if utc:
+        return dt.replace(tzinfo=ZoneInfo("UTC"))
+    if "TZID" in params:
+        return dt.replace(tzinfo=get_zone(params["TZID"].strip('"')))
+    return timezone.make_aware(dt, timezone.get_default_timezone())
+
+
+def read_ics(stream):
+    """
+    Yield ``(line, fields)`` for each VEVENT. The client is taken from
+    X-ORTHO-CLIENT or the first ATTENDEE mailto address.
+    """
+    def logical_lines():
+        # Undo RFC 5545 line folding, keeping the first physical line number
+        pending, pending_no = None, 0
+        for line_no, raw in enumerate(stream, start=1):
+            raw = raw.rstrip("\r\n")
+            if raw[:1] in (" ", "\t") and pending is not None:
+                pending += raw[1:]
+                continue
+            if pending is not None:
+                yield pending_no, pending
+            pending, pending_no = raw, line_no
+        if pending is not None:
+            yield pending_no, pending
+
+    fields = None
+    start_line = 0
+    for line_no, line in logical_lines():
+        key, _, value = line.partition(":")
+        name, *raw_params = key.split(";")
+        name = name.upper()
+        params = dict(p.split("=", 1) for p in raw_params if "=" in p)
+
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            fields = {}
+            start_line = line_no
+        elif name == "END" and value.upper() == "VEVENT" and fields is not None:
+            yield start_line, fields
+            fields = None
+        elif fields is None:
+            continue
+        elif name == "SUMMARY":
+            fields["name"] = _ics_unescape(value)
+        elif name == "DESCRIPTION":
+            fields["description"] = _ics_unescape(value)
+        elif name in ("DTSTART", "DTEND"):
+            try:
+                fields[name[2:].lower()] = _ics_timestamp(params, value)
+            except ValueError as exc:
+                fields.setdefault("error", f"{name}: {exc}")
+        elif name == "X-ORTHO-CLIENT":
+            fields["client"] = value
+        elif name == "ATTENDEE" and value.lower().startswith("mailto:"):
+            fields.setdefault("client", value[7:])
+        elif name == "X-ORTHO-RESOURCE":
+            fields["resource"] = value
+
+
+# --------------------------------------------------------
+# Resolution and planning
+# --------------------------------------------------------
+
+def client_lookup():
+    """Map usernames and lower-cased emails to user ids with a single query."""
+    lookup = {}
+    by_email = {}
+    for pk, username, email in User.objects.values_list("id", "username", "email").iterator():
+        lookup[username] = pk
+        if email:
+            by_email.setdefault(email.lower(), pk)
+    # Usernames win over emails when both match
+    for email, pk in by_email.items():
+        lookup.setdefault(email, pk)
+    return lookup
+
+
+def resource_lookup():
+    return dict(Resource.objects.values_list("name", "id"))
+
+
+def to_row(line, fields, clients, resources, default_approved=True, tz=None):
+    """Validate one parsed record. Returns a Row or a RowError."""
+    if "error" in fields:
+        return RowError(line, fields["error"])
+
+    name = fields.get("name") or fields.get("title")
+    if not name:
+        return RowError(line, "missing title")
+
+    try:
+        start = fields["start"] if isinstance(fields.get("start"), datetime) else parse_timestamp(fields.get("start", ""), tz)
+        end = fields["end"] if isinstance(fields.get("end"), datetime) else parse_timestamp(fields.get("end", ""), tz)
+    except ValueError as exc:
+        return RowError(line, str(exc))
+    if end <= start:
+        return RowError(line, "end is not after start")
+
+    client = fields.get("client", "")
+    user_id = clients.get(client)
+    if user_id is None:
+        user_id = clients.get(client.lower())
+    if user_id is None:
+        return RowError(line, f"unknown client {client!r}")
+
+    resource_id = None
+    if fields.get("resource"):
+        resource_id = resources.get(fields["resource"])
+        if resource_id is None:
+            return RowError(line, f"unknown resource {fields['resource']!r}")
+
+    approved = default_approved
+    if fields.get("approved"):
+        approved = fields["approved"].lower() in ("1", "true", "yes", "y")
+
+    return Row(line, name[:255], start, end, fields.get("description", ""), user_id, resource_id, approved)
+
+
+def sort_key(row):
+    return (row.resource is not None, row.resource or 0, row.start, row.line)
+
+
+def sweep_overlaps(rows, existing):
+    """
+    Split sorted ``rows`` into accepted rows and overlap errors.
+
+    Only approved rows block time. ``existing`` maps resource id to a sorted
+    list of ``(start, end)`` of approved events already in the database.
+    """
+    accepted = []
+    errors = []
+    current = object()
+    busy_end = None
+    busy_line = None
+    blocked = []
+    bi = 0
+
+    for row in rows:
+        if row.resource != current:
+            current = row.resource
+            busy_end = None
+            blocked = existing.get(row.resource, [])
+            bi = 0
+        if not row.approved:
+            accepted.append(row)
+            continue
+
+        # Existing events that start before this row cannot matter to later rows
+        # once they have ended, so one pointer walks the list.
+        while bi < len(blocked) and blocked[bi][0] < row.end:
+            end = blocked[bi][1]
+            if busy_end is None or end > busy_end:
+                busy_end, busy_line = end, None
+            bi += 1
+
+        if busy_end is not None and row.start < busy_end:
+            where = f"row {busy_line}" if busy_line else "an existing approved appointment"
+            errors.append(RowError(row.line, f"overlaps {where}"))
+            continue
+
+        accepted.append(row)
+        busy_end, busy_line = row.end, row.line
+
+    return accepted, errors
+
+
+def existing_approved(rows, baseline_id):
+    """Approved events (up to ``baseline_id``) in the span of ``rows``, grouped by resource."""
+    approved = [r for r in rows if r.approved]
+    if not approved:
+        return {}
+    lo = min(r.start for r in approved)
+    hi = max(r.end for r in approved)
+    existing = {}
+    qs = Event.objects.filter(
+        is_approved=True, id__lte=baseline_id, start__lt=hi, end__gt=lo
+    ).order_by("resource_id", "start").values_list("resource_id", "start", "end")
+    for resource_id, start, end in qs.iterator():
+        existing.setdefault(resource_id, []).append((start, end))
+    return existing
+
+
+# --------------------------------------------------------
+# Writing
+# --------------------------------------------------------
+
+def import_inputs(pending, timezone_name, rows):
+    """
+    Everything besides the file that decides which rows are accepted, and in
+    what order. A checkpoint is only valid for the same inputs. Only the
+    clients and resources the rows resolved to count, so unrelated signups
+    do not block a resume.
+    """
+    resolved = json.dumps([(r.line, r.client, r.resource, r.approved) for r in rows])
+    return {
+        "pending": bool(pending),
+        "timezone": timezone_name or None,
+        "rows": hashlib.sha256(resolved.encode()).hexdigest(),
+    }
+
+
+def load_checkpoint(path, source, inputs):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as fh:
+        state = json.load(fh)
+    stat = os.stat(source)
+    if state.get("source") != os.path.abspath(source) or state.get("size") != stat.st_size:
+        raise ImportFormatError(f"checkpoint {path} belongs to a different input file")
+    if state.get("inputs") != inputs:
+        raise ImportFormatError(
+            f"checkpoint {path} was written with different options, users or resources; "
+            "rerun with the original options or delete the checkpoint"
+        )
+    return state
+
+
+def resume_offset(rows, done, baseline_id):
+    """
+    Number of ``rows`` already written. The checkpoint is saved after each
+    chunk commits, so a crash in between leaves it one chunk behind; rows are
+    written in order, so the rows after ``done`` that are already in the
+    database (past ``baseline_id``) are counted as well.
+    """
+    remaining = rows[done:]
+    if not remaining:
+        return done
+    written = Counter(
+        Event.objects.filter(
+            id__gt=baseline_id,
+            start__gte=min(r.start for r in remaining),
+            end__lte=max(r.end for r in remaining),
+        ).values_list("created_by_id", "resource_id", "name", "start", "end").iterator()
+    )
+    for row in remaining:
+        key = (row.client, row.resource, row.name, row.start, row.end)
+        if not written[key]:
+            break
+        written[key] -= 1
+        done += 1
+    return done
+
+
+def save_checkpoint(path, state):
+    if not path:
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as fh:
+        json.dump(state, fh)
+    os.replace(tmp, path)
+
+
+def write_rows(rows, chunk_size, start_at=0, on_chunk=None):
+    """bulk_create ``rows[start_at:]`` in chunks, one transaction each."""
+    approved_at = timezone.now()
+    written = start_at
+    for offset in range(start_at, len(rows), chunk_size):
+        chunk = rows[offset:offset + chunk_size]
+        events = [
+            Event(
+                name=r.name,
+                start=r.start,
+                end=r.end,
+                description=r.description,
+                created_by_id=r.client,
+                resource_id=r.resource,
+                is_approved=r.approved,
+                approved_at=approved_at if r.approved else None,
+            )
+            for r in chunk
+        ]
+        with transaction.atomic():
+            Event.objects.bulk_create(events, batch_size=chunk_size)
+        written += len(chunk)
+        if on_chunk:
+            on_chunk(written)
+    return written
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from appointments.scheduler import apply_schedule
+
+
+class Command(BaseCommand):
+    help = "Approve the best conflict-free set of pending appointments."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--start", help="Only pending events starting at or after this ISO datetime")
+        parser.add_argument("--end", help="Only pending events starting before this ISO datetime")
+        parser.add_argument("--dry-run", action="store_true", help="Show the plan without approving anything")
+        parser.add_argument("--no-email", action="store_true", help="Do not send confirmation emails")
+
+    def handle(self, *args, **options):
+        window = {}
+        for key in ("start", "end"):
+            if options[key]:
+                window[key] = parse_datetime(options[key])
+                if not window[key]:
+                    raise CommandError(f"Invalid ISO datetime for --{key}")
+
+        schedule = apply_schedule(
+            window.get("start"),
+            window.get("end"),
+            dry_run=options["dry_run"],
+            notify=not options["no_email"],
+        )
+
+        verb = "Would approve" if options["dry_run"] else "Approved"
+        self.stdout.write(f"{verb} {len(schedule.approved)} event(s): {schedule.approved}")
+        self.stdout.write(f"Left pending {len(schedule.rejected)} event(s): {schedule.rejected}")
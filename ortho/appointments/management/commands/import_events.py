@@ -0,0 +1,119 @@
+import csv
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+
+from appointments.importer import (
+    ImportFormatError,
+    RowError,
+    client_lookup,
+    existing_approved,
+    get_zone,
+    import_inputs,
+    load_checkpoint,
+    read_csv,
+    read_ics,
+    resource_lookup,
+    resume_offset,
+    save_checkpoint,
+    sort_key,
+    sweep_overlaps,
+    to_row,
+    write_rows,
+)
+from appointments.models import Event
+
+
+class Command(BaseCommand):
+    help = "Bulk import historical appointments from a CSV or ICS file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or ICS file to import")
+        parser.add_argument("--format", choices=["csv", "ics"], help="Input format (default: from the file extension)")
+        parser.add_argument("--pending", action="store_true", help="Import rows as pending unless they have an 'approved' column")
+        parser.add_argument("--timezone", help="Time zone for naive timestamps (default: TIME_ZONE)")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Rows per bulk insert/transaction")
+        parser.add_argument("--checkpoint", help="Checkpoint file (default: <path>.checkpoint.json)")
+        parser.add_argument("--errors", help="Write rejected rows to this CSV file")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only, write nothing")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        fmt = options["format"] or ("ics" if path.lower().endswith((".ics", ".ical")) else "csv")
+        try:
+            tz = get_zone(options["timezone"]) if options["timezone"] else None
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        checkpoint = options["checkpoint"] or f"{path}.checkpoint.json"
+        began = time.monotonic()
+
+        clients = client_lookup()
+        resources = resource_lookup()
+        rows, errors = [], []
+        reader = read_ics if fmt == "ics" else read_csv
+        with open(path, newline="", encoding="utf-8") as stream:
+            try:
+                for line, fields in reader(stream):
+                    row = to_row(line, fields, clients, resources, default_approved=not options["pending"], tz=tz)
+                    (errors if isinstance(row, RowError) else rows).append(row)
+            except ImportFormatError as exc:
+                raise CommandError(str(exc))
+
+        rows.sort(key=sort_key)
+        inputs = import_inputs(options["pending"], options["timezone"], rows)
+        try:
+            state = load_checkpoint(checkpoint, path, inputs)
+        except ImportFormatError as exc:
+            raise CommandError(str(exc))
+        resuming = state is not None
+        if state is None:
+            state = {
+                "source": os.path.abspath(path),
+                "size": os.stat(path).st_size,
+                "inputs": inputs,
+                "baseline_id": Event.objects.aggregate(m=Max("id"))["m"] or 0,
+                "done": 0,
+            }
+
+        accepted, overlaps = sweep_overlaps(rows, existing_approved(rows, state["baseline_id"]))
+        errors.extend(overlaps)
+        errors.sort()
+
+        if options["errors"]:
+            with open(options["errors"], "w", newline="") as fh:
+                writer = csv.writer(fh)
+                writer.writerow(["line", "error"])
+                writer.writerows(errors)
+
+        if options["dry_run"]:
+            self.stdout.write(f"{len(accepted)} row(s) would be imported, {len(errors)} rejected")
+            return
+
+        if resuming:
+            state["done"] = resume_offset(accepted, state["done"], state["baseline_id"])
+            self.stdout.write(f"Resuming after {state['done']} imported row(s)")
+        # Saved before the first chunk too, so its baseline survives a crash
+        save_checkpoint(checkpoint, state)
+
+        def on_chunk(done):
+            state["done"] = done
+            save_checkpoint(checkpoint, state)
+            self.stdout.write(f"  {done}/{len(accepted)} row(s) written")
+
+        resumed_from = state["done"]
+        written = write_rows(accepted, options["chunk_size"], start_at=resumed_from, on_chunk=on_chunk)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {written - resumed_from} row(s), rejected {len(errors)} "
+            f"in {time.monotonic() - began:.1f}s"
+        ))
+        for error in errors[:20]:
+            self.stdout.write(f"  line {error.line}: {error.message}")
+        if len(errors) > 20:
+            self.stdout.write(f"  ... {len(errors) - 20} more (use --errors to save them all)")
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from appointments.reminders import process_due_reminders, worker_token
+
+
+class Command(BaseCommand):
+    help = "Send appointment reminder emails. Runs until interrupted unless --once is given."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Process one batch and exit")
+        parser.add_argument("--interval", type=float, default=30, help="Seconds to sleep when nothing is due")
+        parser.add_argument("--batch-size", type=int, default=500, help="Reminders claimed per tick")
+
+    def handle(self, *args, **options):
+        token = worker_token()
+        self.stdout.write(f"Reminder worker {token} started")
+        try:
+            while True:
+                counts = process_due_reminders(batch_size=options["batch_size"], token=token)
+                if any(counts.values()):
+                    self.stdout.write(
+                        f"sent {counts['sent']}, failed {counts['failed']}, cancelled {counts['cancelled']}"
+                    )
+                if options["once"]:
+                    break
+                # A full batch means more may be waiting; go again straight away
+                if sum(counts.values()) < options["batch_size"]:
+                    time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            self.stdout.write("Reminder worker stopped")
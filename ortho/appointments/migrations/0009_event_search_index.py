@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from appointments.search import ensure_index
+    ensure_index(schema_editor.connection)
+
+
+def drop_index(apps, schema_editor):
+    from appointments.search import drop_index
+    drop_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0008_event_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0009_event_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset', models.DurationField()),
+                ('event_start', models.DateTimeField()),
+                ('due_at', models.DateTimeField()),
+                ('status', models.CharField(choices=[('claimed', 'Claimed'), ('sent', 'Sent'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='claimed', max_length=16)),
+                ('claimed_by', models.CharField(blank=True, max_length=64)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='appointments.event')),
+            ],
+            options={
+                'db_table': 'reminders',
+                'ordering': ['due_at'],
+                'indexes': [models.Index(fields=['status', 'claimed_at'], name='reminders_status_claim_idx'), models.Index(fields=['due_at'], name='reminders_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('event', 'offset', 'event_start'), name='reminders_unique_per_start')],
+            },
+        ),
+    ]
@@ -1,6 +1,18 @@
 from django.db import models
 from django.contrib.auth.models import User
-from datetime import datetime
+from django.utils import timezone
+
+class Resource(models.Model):
+    """A practitioner or room that can hold one appointment at a time."""
+    name = models.CharField(max_length=255, unique=True)
+    is_active = models.BooleanField(default=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
 
 class Event(models.Model):
     id = models.AutoField(primary_key=True)
@@ -9,18 +21,88 @@ class Event(models.Model):
     end = models.DateTimeField()
     description = models.TextField(blank=True, null=True) 
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='events')
+    resource = models.ForeignKey(Resource, on_delete=models.PROTECT, related_name='events', null=True, blank=True)
     is_approved = models.BooleanField(default=False)
     approved_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Client priority used by the auto-scheduler (higher wins conflicts)
+    priority = models.PositiveSmallIntegerField(default=0)
+    # Bumped on every write to guard update_event (If-Match / 412)
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     class Meta:
         db_table = "events"
         ordering = ["start"]
+        indexes = [
+            models.Index(fields=["is_approved", "start"], name="events_approved_start_idx"),
+            models.Index(fields=["resource", "start", "end"], name="events_resource_span_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({'Approved' if self.is_approved else 'Pending'})"
     
 class Availability(models.Model):
-    weekday = models.IntegerField(choices=[(i, datetime.strftime(datetime.strptime(str(i), "%w"), "%A")) for i in range(7)])
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='availability', null=True, blank=True)
+    # Same numbering as strftime's %w: 0 = Sunday ... 6 = Saturday
+    WEEKDAY_CHOICES = [
+        (0, "Sunday"),
+        (1, "Monday"),
+        (2, "Tuesday"),
+        (3, "Wednesday"),
+        (4, "Thursday"),
+        (5, "Friday"),
+        (6, "Saturday"),
+    ]
+
+    weekday = models.IntegerField(choices=WEEKDAY_CHOICES)
     start_time = models.TimeField()
     end_time = models.TimeField()
 
+
+
+class Reminder(models.Model):
+    """
+    Delivery record of one reminder email for one event.
+
+    Rows are created when a worker claims a due reminder (see
+    appointments/reminders.py); the unique constraint is what stops two
+    workers from sending the same reminder.
+    """
+    CLAIMED = "claimed"
+    SENT = "sent"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    STATUS_CHOICES = [
+        (CLAIMED, "Claimed"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+        (CANCELLED, "Cancelled"),
+    ]
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='reminders')
+    offset = models.DurationField()
+    # Event start the reminder was computed for; a moved event gets a new one
+    event_start = models.DateTimeField()
+    due_at = models.DateTimeField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=CLAIMED)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # After a failed send, the claiming worker waits until then to retry
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        db_table = "reminders"
+        ordering = ["due_at"]
+        constraints = [
+            models.UniqueConstraint(fields=["event", "offset", "event_start"], name="reminders_unique_per_start"),
+        ]
+        indexes = [
+            models.Index(fields=["status", "claimed_at"], name="reminders_status_claim_idx"),
+            models.Index(fields=["due_at"], name="reminders_due_idx"),
+        ]
+
+    def __str__(self):
+        return f"Reminder for {self.event_id} at {self.due_at:%Y-%m-%d %H:%M} ({self.status})"
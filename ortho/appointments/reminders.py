@@ -0,0 +1,184 @@
+"""
+Appointment reminder emails.
+
+Reminders are sent ``REMINDER_OFFSETS`` before each approved event. There is
+no per-event bookkeeping up front. Each tick, a worker range-scans the
+(is_approved, start) index for events starting within an offset of "now" and
+claims them by inserting a Reminder row. The unique (event, offset,
+event_start) constraint decides which worker wins. A worker only sends the
+rows stamped with its own claim token. A failed send keeps its claim and is
+retried after ``REMINDER_RETRY_DELAY``, doubling each attempt. Rows left
+claimed by a crashed worker are taken over after ``REMINDER_CLAIM_TIMEOUT``.
+A worker that falls behind sends only the closest due reminder; an offset is
+skipped once a smaller one is due too.
+"""
+import os
+import socket
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection, send_mail
+from django.db.models import Exists, F, OuterRef, Q
+from django.utils import timezone
+
+from .models import Event, Reminder
+
+
+DEFAULT_OFFSETS = [timedelta(hours=24), timedelta(hours=2)]
+
+
+def reminder_offsets():
+    return getattr(settings, "REMINDER_OFFSETS", DEFAULT_OFFSETS)
+
+
+def claim_timeout():
+    return getattr(settings, "REMINDER_CLAIM_TIMEOUT", timedelta(minutes=10))
+
+
+def retry_delay():
+    return getattr(settings, "REMINDER_RETRY_DELAY", timedelta(minutes=5))
+
+
+def next_offset(offset):
+    """The next smaller offset (or zero); once it is due, ``offset`` is superseded."""
+    return max((o for o in reminder_offsets() if o < offset), default=timedelta(0))
+
+
+def max_attempts():
+    return getattr(settings, "REMINDER_MAX_ATTEMPTS", 3)
+
+
+def worker_token():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def claim_due(now, token, batch_size=500):
+    """
+    Claim up to ``batch_size`` due reminders for ``token``.
+    Returns the number of rows claimed.
+    """
+    claimed = 0
+    for offset in reminder_offsets():
+        if claimed >= batch_size:
+            break
+        # Due means start - offset <= now < start - next smaller offset. Events
+        # approved after the due time are skipped; the approval email already
+        # covered them.
+        already = Reminder.objects.filter(event=OuterRef("pk"), offset=offset, event_start=OuterRef("start"))
+        due = list(
+            Event.objects.filter(is_approved=True, start__gt=now + next_offset(offset), start__lte=now + offset)
+            .filter(Q(approved_at__isnull=True) | Q(approved_at__lte=F("start") - offset))
+            .exclude(Exists(already))
+            .order_by("start")
+            .values_list("id", "start")[: batch_size - claimed]
+        )
+        if not due:
+            continue
+        new = [
+            Reminder(
+                event_id=pk,
+                offset=offset,
+                event_start=start,
+                due_at=start - offset,
+                claimed_by=token,
+                claimed_at=now,
+            )
+            for pk, start in due
+        ]
+        # Losing an insert race to another worker is expected; its row stays theirs.
+        Reminder.objects.bulk_create(new, ignore_conflicts=True)
+        claimed += Reminder.objects.filter(
+            claimed_by=token, claimed_at=now, offset=offset, event_id__in=[pk for pk, _ in due]
+        ).count()
+
+    # Take over claims abandoned by a crashed worker. The conditional UPDATE
+    # lets exactly one worker win each row.
+    stale = now - claim_timeout()
+    stale_ids = list(
+        Reminder.objects.filter(status=Reminder.CLAIMED, claimed_at__lt=stale)
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if stale_ids:
+        claimed += Reminder.objects.filter(
+            id__in=stale_ids, status=Reminder.CLAIMED, claimed_at__lt=stale
+        ).update(claimed_by=token, claimed_at=now)
+    return claimed
+
+
+def send_reminder(reminder, connection=None):
+    event = reminder.event
+    send_mail(
+        "Appointment Reminder",
+        f"Reminder: your appointment '{event.name}' is on {event.start.strftime('%Y-%m-%d %H:%M')}.",
+        settings.DEFAULT_FROM_EMAIL,
+        [event.created_by.email],
+        fail_silently=False,
+        connection=connection,
+    )
+
+
+def deliver_claimed(now, token):
+    """
+    Send every reminder claimed by ``token`` that is not waiting for a retry.
+
+    A long batch can outlive the claim timeout, so each claim is renewed right
+    before its send and every write is conditional on still owning the row:
+    a reminder taken over by another worker is left to that worker.
+    """
+    counts = {Reminder.SENT: 0, Reminder.FAILED: 0, Reminder.CANCELLED: 0}
+    claimed = (
+        Reminder.objects.filter(status=Reminder.CLAIMED, claimed_by=token)
+        .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now))
+        .select_related("event__created_by")
+    )
+    began = time.monotonic()
+    connection = get_connection()
+    try:
+        for reminder in claimed:
+            owned = Reminder.objects.filter(id=reminder.id, claimed_by=token, status=Reminder.CLAIMED)
+            current = now + timedelta(seconds=time.monotonic() - began)
+            if not owned.update(claimed_at=current):
+                continue
+
+            event = reminder.event
+            changes = {}
+            if (
+                not event.is_approved
+                or event.start != reminder.event_start
+                or event.start <= now + next_offset(reminder.offset)
+                or not event.created_by.email
+            ):
+                # Unapproved, moved or started since the claim, superseded by a
+                # closer reminder, or nobody to write to
+                changes["status"] = Reminder.CANCELLED
+            else:
+                changes["attempts"] = reminder.attempts + 1
+                try:
+                    # One SMTP session for the whole batch; no-op once open
+                    connection.open()
+                    send_reminder(reminder, connection)
+                except Exception as exc:
+                    changes["last_error"] = str(exc)
+                    if changes["attempts"] >= max_attempts():
+                        changes["status"] = Reminder.FAILED
+                    else:
+                        # Keep the claim and retry after a delay that doubles each attempt
+                        changes["next_attempt_at"] = now + retry_delay() * 2 ** reminder.attempts
+                else:
+                    changes["status"] = Reminder.SENT
+                    changes["sent_at"] = current
+            if owned.update(**changes):
+                counts[changes.get("status", Reminder.FAILED)] += 1
+    finally:
+        connection.close()
+    return counts
+
+
+def process_due_reminders(now=None, batch_size=500, token=None):
+    """One worker tick: claim a batch of due reminders and send them."""
+    now = now or timezone.now()
+    token = token or worker_token()
+    claim_due(now, token, batch_size)
+    return deliver_claimed(now, token)
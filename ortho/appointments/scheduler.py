@@ -0,0 +1,171 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from .models import Event
+
+
+# Weight of one day of waiting and of one level of client priority.
+# Every request is worth at least 1; the plan maximises the summed weight,
+# so one heavy request can win over several light ones it conflicts with.
+AGE_WEIGHT = getattr(settings, "AUTOSCHEDULE_AGE_WEIGHT", 1.0)
+PRIORITY_WEIGHT = getattr(settings, "AUTOSCHEDULE_PRIORITY_WEIGHT", 10.0)
+
+Candidate = namedtuple("Candidate", "id start end weight resource", defaults=(None,))
+Schedule = namedtuple("Schedule", "approved rejected")
+
+
+def request_weight(created_at, priority, reference):
+    """Score of a pending request: older requests and higher priority clients first."""
+    age_days = max((reference - created_at).total_seconds(), 0) / 86400
+    return 1.0 + AGE_WEIGHT * age_days + PRIORITY_WEIGHT * priority
+
+
+def select_requests(candidates, blocked=()):
+    """
+    Weighted interval scheduling over ``candidates``.
+
+    ``blocked`` holds ``(start, end)`` pairs of already approved events;
+    any candidate overlapping one of them is dropped up front. The
+    remaining candidates are solved with the classic O(n log n) dynamic
+    program (sort by end, binary search the last compatible interval).
+    Returns the list of chosen candidates ordered by start.
+    """
+    blocked = sorted(blocked)
+    blocked_starts = [s for s, _ in blocked]
+    # Running max of end times lets a single bisect answer "does anything
+    # starting before `end` finish after `start`?"
+    blocked_max_end = []
+    for _, e in blocked:
+        blocked_max_end.append(max(e, blocked_max_end[-1]) if blocked_max_end else e)
+
+    free = []
+    for c in candidates:
+        if c.start >= c.end:
+            continue
+        i = bisect_left(blocked_starts, c.end) - 1
+        if i >= 0 and blocked_max_end[i] > c.start:
+            continue
+        free.append(c)
+
+    free.sort(key=lambda c: c.end)
+    ends = [c.end for c in free]
+    best = [0.0] * (len(free) + 1)
+    take = [False] * len(free)
+    prev = [0] * len(free)
+    for i, c in enumerate(free):
+        # Number of intervals ending at or before this one starts.
+        p = bisect_right(ends, c.start, 0, i)
+        prev[i] = p
+        with_it = best[p] + c.weight
+        if with_it > best[i]:
+            best[i + 1] = with_it
+            take[i] = True
+        else:
+            best[i + 1] = best[i]
+
+    chosen = []
+    i = len(free)
+    while i > 0:
+        if take[i - 1]:
+            chosen.append(free[i - 1])
+            i = prev[i - 1]
+        else:
+            i -= 1
+    chosen.reverse()
+    return chosen
+
+
+def plan_schedule(window_start=None, window_end=None, reference=None):
+    """
+    Build the best approval set for pending events starting inside the window.
+    Each resource is its own timeline and is solved independently.
+
+    Returns a ``Schedule`` of two lists of event ids: the ones to approve and
+    the ones left pending because they conflict.
+    """
+    reference = reference or now()
+    pending = Event.objects.filter(is_approved=False)
+    if window_start is not None:
+        pending = pending.filter(start__gte=window_start)
+    if window_end is not None:
+        pending = pending.filter(start__lt=window_end)
+    rows = list(pending.order_by().values_list("id", "start", "end", "created_at", "priority", "resource_id"))
+    if not rows:
+        return Schedule([], [])
+
+    candidates = [
+        Candidate(pk, start, end, request_weight(created_at, priority, reference), resource)
+        for pk, start, end, created_at, priority, resource in rows
+    ]
+    by_resource = defaultdict(list)
+    for c in candidates:
+        by_resource[c.resource].append(c)
+
+    lo = min(c.start for c in candidates)
+    hi = max(c.end for c in candidates)
+    blocked = defaultdict(list)
+    for resource, start, end in Event.objects.filter(
+        is_approved=True, start__lt=hi, end__gt=lo
+    ).order_by().values_list("resource_id", "start", "end"):
+        blocked[resource].append((start, end))
+
+    chosen = set()
+    for resource, group in by_resource.items():
+        chosen.update(c.id for c in select_requests(group, blocked[resource]))
+    approved = [c.id for c in candidates if c.id in chosen]
+    rejected = [c.id for c in candidates if c.id not in chosen]
+    return Schedule(approved, rejected)
+
+
+def lock_event_writes():
+    """
+    Take the events write lock for the current transaction, so no approval
+    can slip in between reading the approved set and writing a new one.
+    SQLite otherwise starts transactions deferred (read-only until the first
+    write). Call inside ``transaction.atomic()``.
+    """
+    table = connection.ops.quote_name(Event._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"UPDATE {table} SET id = id WHERE 0")
+        elif connection.vendor == "postgresql":
+            cursor.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+
+
+def apply_schedule(window_start=None, window_end=None, dry_run=False, notify=True):
+    """
+    Plan and, unless ``dry_run``, approve the chosen events in one transaction.
+    Clients of approved events get the usual confirmation email.
+    """
+    with transaction.atomic():
+        if not dry_run:
+            lock_event_writes()
+        schedule = plan_schedule(window_start, window_end)
+        if dry_run or not schedule.approved:
+            return schedule
+        approved_at = now()
+        Event.objects.filter(id__in=schedule.approved, is_approved=False).update(
+            is_approved=True, approved_at=approved_at, version=F("version") + 1
+        )
+
+    if notify:
+        events = Event.objects.filter(id__in=schedule.approved).select_related("created_by")
+        messages = [
+            (
+                "Appointment Confirmed",
+                f"Your appointment '{ev.name}' on {ev.start.strftime('%Y-%m-%d %H:%M')} has been approved.",
+                settings.DEFAULT_FROM_EMAIL,
+                [ev.created_by.email],
+            )
+            for ev in events
+            if ev.created_by.email
+        ]
+        if messages:
+            send_mass_mail(messages, fail_silently=True)
+    return schedule
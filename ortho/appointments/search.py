@@ -0,0 +1,161 @@
+"""
+Full-text search over event titles and descriptions.
+
+On SQLite an external-content FTS5 table (``events_fts``) indexes
+``events.name`` and ``events.description``. Triggers keep it in sync, so bulk
+inserts and ``QuerySet.update()`` are covered as well. SQLite rebuilds a
+table when some migrations alter it, which drops its triggers, so
+``ensure_index`` runs again after every migrate. On other databases,
+search falls back to ``icontains`` without ranking.
+"""
+import html
+import re
+
+from django.db import connection, connections
+from django.db.models import Q
+
+from .models import Event
+
+
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+_TABLE_SQL = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+        name, description,
+        content='events', content_rowid='id',
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+"""
+
+_TRIGGERS_SQL = [
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_insert AFTER INSERT ON events BEGIN
+        INSERT INTO events_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_delete AFTER DELETE ON events BEGIN
+        INSERT INTO events_fts(events_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS events_fts_update AFTER UPDATE OF name, description ON events BEGIN
+        INSERT INTO events_fts(events_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO events_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS events_fts_update",
+    "DROP TRIGGER IF EXISTS events_fts_delete",
+    "DROP TRIGGER IF EXISTS events_fts_insert",
+    "DROP TABLE IF EXISTS events_fts",
+]
+
+
+def index_available(conn=connection):
+    return conn.vendor == "sqlite"
+
+
+def ensure_index(conn=connection):
+    """Create the FTS table and triggers if missing; rebuild when any were lost."""
+    if not index_available(conn):
+        return
+    if Event._meta.db_table not in conn.introspection.table_names():
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'events_fts_%'"
+        )
+        complete = cursor.fetchone()[0] == len(_TRIGGERS_SQL)
+        cursor.execute(_TABLE_SQL)
+        for sql in _TRIGGERS_SQL:
+            cursor.execute(sql)
+        if not complete:
+            cursor.execute("INSERT INTO events_fts(events_fts) VALUES ('rebuild')")
+
+
+def drop_index(conn=connection):
+    if not index_available(conn):
+        return
+    with conn.cursor() as cursor:
+        for sql in _DROP_SQL:
+            cursor.execute(sql)
+
+
+def match_expression(query):
+    """
+    Turn free text into a safe FTS5 query: every word must match, the last
+    one as a prefix so results show up while typing.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def highlight(snippet):
+    """Escape a snippet and turn FTS markers into <mark> tags."""
+    return (
+        html.escape(snippet or "")
+        .replace(SNIPPET_START, "<mark>")
+        .replace(SNIPPET_END, "</mark>")
+    )
+
+
+def matching_ids_sql(query):
+    """``(sql, params)`` selecting ids of events matching ``query``, for ``RawSQL``."""
+    return "SELECT rowid FROM events_fts WHERE events_fts MATCH %s", [match_expression(query)]
+
+
+def search_events(query, queryset=None, limit=50):
+    """
+    Rank events matching ``query`` (best first), restricted to ``queryset``
+    (date/client filters). Returns dicts with id, rank and highlighted
+    title/description snippets.
+    """
+    queryset = Event.objects.all() if queryset is None else queryset
+    expression = match_expression(query)
+    if not expression:
+        return []
+
+    conn = connections[queryset.db]
+    if not index_available(conn):
+        events = queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))[:limit]
+        return [
+            {"id": ev.id, "rank": 0.0, "title": html.escape(ev.name), "snippet": html.escape(ev.description or "")}
+            for ev in events
+        ]
+
+    # Only restrict to the queryset when it is filtered; an unfiltered search
+    # should not read every event id
+    restrict, sub_params = "", []
+    if queryset.query.where:
+        ids = queryset.order_by().values("id")
+        subquery, sub_params = ids.query.get_compiler(using=queryset.db).as_sql()
+        restrict = f"AND rowid IN ({subquery})"
+    sql = f"""
+        SELECT rowid, bm25(events_fts, 10.0, 1.0) AS rank,
+               highlight(events_fts, 0, %s, %s),
+               snippet(events_fts, 1, %s, %s, '…', 16)
+        FROM events_fts
+        WHERE events_fts MATCH %s {restrict}
+        ORDER BY rank
+        LIMIT %s
+    """
+    params = [SNIPPET_START, SNIPPET_END, SNIPPET_START, SNIPPET_END, expression, *sub_params, limit]
+    with conn.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    return [
+        {"id": pk, "rank": rank, "title": highlight(title), "snippet": highlight(snippet)}
+        for pk, rank, title, snippet in rows
+    ]
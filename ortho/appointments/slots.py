@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .models import Availability, Event
+
+
+def available_slots(resource, day, duration=timedelta(minutes=30)):
+    """
+    Free ``duration``-long slots of ``resource`` on ``day``.
+
+    Opening hours come from the resource's Availability rows (weekday uses
+    the ``%w`` numbering, 0 = Sunday); approved events of that resource are
+    subtracted. Returns a list of ``(start, end)`` aware datetimes.
+    """
+    weekday = (day.weekday() + 1) % 7
+    tz = timezone.get_current_timezone()
+    windows = sorted(
+        (
+            timezone.make_aware(datetime.combine(day, a.start_time), tz),
+            timezone.make_aware(datetime.combine(day, a.end_time), tz),
+        )
+        for a in Availability.objects.filter(resource=resource, weekday=weekday)
+    )
+    if not windows:
+        return []
+
+    # Merge overlapping or touching rows (e.g. 9-17 and 10-12) so no time is
+    # offered twice
+    merged = [windows[0]]
+    for open_at, close_at in windows[1:]:
+        if open_at <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], close_at))
+        else:
+            merged.append((open_at, close_at))
+    windows = merged
+
+    busy = list(
+        Event.objects.filter(
+            resource=resource,
+            is_approved=True,
+            start__lt=windows[-1][1],
+            end__gt=windows[0][0],
+        ).order_by("start").values_list("start", "end")
+    )
+
+    slots = []
+    for open_at, close_at in windows:
+        cursor = open_at
+        for start, end in busy:
+            if end <= cursor or start >= close_at:
+                continue
+            while cursor + duration <= min(start, close_at):
+                slots.append((cursor, cursor + duration))
+                cursor += duration
+            cursor = max(cursor, end)
+        while cursor + duration <= close_at:
+            slots.append((cursor, cursor + duration))
+            cursor += duration
+    return slots
@@ -1,3 +1,540 @@
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.mail import get_connection
+from django.core.management import CommandError, call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import make_aware
+
+from .importer import save_checkpoint
+from .models import Availability, Event, Reminder, Resource
+from .reminders import claim_due, deliver_claimed, process_due_reminders
+from .scheduler import Candidate, select_requests
+
+
+BASE = datetime(2030, 1, 7, 9, 0, tzinfo=dt_timezone.utc)
+
+
+def at(minutes):
+    return BASE + timedelta(minutes=minutes)
+
+
+class SelectRequestsTests(TestCase):
+    def test_prefers_heavier_conflicting_request(self):
+        chosen = select_requests([
+            Candidate(1, at(0), at(60), 1.0),
+            Candidate(2, at(30), at(90), 5.0),
+            Candidate(3, at(90), at(120), 1.0),
+        ])
+        self.assertEqual([c.id for c in chosen], [2, 3])
+
+    def test_two_light_requests_beat_one_heavier(self):
+        chosen = select_requests([
+            Candidate(1, at(0), at(30), 2.0),
+            Candidate(2, at(30), at(60), 2.0),
+            Candidate(3, at(0), at(60), 3.0),
+        ])
+        self.assertEqual([c.id for c in chosen], [1, 2])
+
+    def test_skips_requests_overlapping_approved(self):
+        chosen = select_requests(
+            [Candidate(1, at(0), at(30), 1.0), Candidate(2, at(60), at(90), 1.0)],
+            blocked=[(at(-60), at(10))],
+        )
+        self.assertEqual([c.id for c in chosen], [2])
+
+    def test_thousands_of_requests_are_fast(self):
+        rng = random.Random(0)
+        candidates = []
+        for i in range(5000):
+            start = rng.randrange(0, 60 * 24 * 30, 15)
+            candidates.append(Candidate(i, at(start), at(start + rng.choice((30, 45, 60))), rng.random() + 1))
+        blocked = [(at(m), at(m + 30)) for m in range(0, 60 * 24 * 30, 600)]
+        began = time.perf_counter()
+        chosen = select_requests(candidates, blocked)
+        self.assertLess(time.perf_counter() - began, 1.0)
+        for a, b in zip(chosen, chosen[1:]):
+            self.assertLessEqual(a.end, b.start)
+
+
+class AutoScheduleViewTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.client_user = User.objects.create_user("client", password="pw", email="c@example.com")
+        self.url = reverse("auto_schedule")
+
+    def make_event(self, start, end, **kwargs):
+        return Event.objects.create(name="Session", start=at(start), end=at(end), created_by=self.client_user, **kwargs)
+
+    def test_dry_run_does_not_approve(self):
+        low = self.make_event(0, 60)
+        high = self.make_event(30, 90, priority=3)
+        self.client.force_login(self.staff)
+        res = self.client.post(self.url, json.dumps({"dry_run": True}), content_type="application/json")
+        self.assertEqual(res.json(), {"status": "preview", "approved": [high.id], "rejected": [low.id]})
+        self.assertFalse(Event.objects.filter(is_approved=True).exists())
+
+    def test_approves_plan(self):
+        self.make_event(0, 60, is_approved=True)
+        blocked = self.make_event(30, 90)
+        free = self.make_event(90, 120)
+        self.client.force_login(self.staff)
+        res = self.client.post(self.url, "{}", content_type="application/json")
+        self.assertEqual(res.json()["approved"], [free.id])
+        free.refresh_from_db()
+        blocked.refresh_from_db()
+        self.assertTrue(free.is_approved)
+        self.assertIsNotNone(free.approved_at)
+        self.assertEqual(free.version, 2)
+        self.assertFalse(blocked.is_approved)
+
+    def test_staff_only(self):
+        self.client.force_login(self.client_user)
+        res = self.client.post(self.url, "{}", content_type="application/json")
+        self.assertEqual(res.status_code, 403)
+
+
+class ResourcePartitionTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.room_a = Resource.objects.create(name="Room A")
+        self.room_b = Resource.objects.create(name="Room B")
+        Event.objects.create(
+            name="Taken", start=at(0), end=at(60), created_by=self.staff,
+            resource=self.room_a, is_approved=True,
+        )
+        self.client.force_login(self.staff)
+
+    def book(self, resource):
+        payload = {"title": "Session", "start": at(0).isoformat(), "end": at(30).isoformat(), "resource_id": resource.id}
+        return self.client.post(reverse("get_events"), json.dumps(payload), content_type="application/json")
+
+    def test_conflicts_are_per_resource(self):
+        self.assertEqual(self.book(self.room_a).status_code, 409)
+        self.assertEqual(self.book(self.room_b).status_code, 201)
+
+    def test_feed_filters_by_resource(self):
+        self.book(self.room_b)
+        res = self.client.get(reverse("get_events"), {"resource": self.room_b.id})
+        self.assertEqual([ev["resourceId"] for ev in res.json()], [self.room_b.id])
+
+    def test_slots_skip_approved_events(self):
+        day = date(2030, 1, 7)  # a Monday
+        Availability.objects.create(resource=self.room_a, weekday=1, start_time=dt_time(9), end_time=dt_time(11))
+        res = self.client.get(reverse("get_slots", args=[self.room_a.id]), {"date": day.isoformat(), "duration": 30})
+        starts = [slot["start"][11:16] for slot in res.json()]
+        self.assertEqual(starts, ["10:00", "10:30"])
+
+    def test_slots_with_nested_availability(self):
+        day = date(2030, 1, 7)
+        Availability.objects.create(resource=self.room_a, weekday=1, start_time=dt_time(9), end_time=dt_time(12))
+        Availability.objects.create(resource=self.room_a, weekday=1, start_time=dt_time(10), end_time=dt_time(11))
+        Event.objects.create(
+            name="Late", start=at(120), end=at(180), created_by=self.staff,
+            resource=self.room_a, is_approved=True,
+        )
+        res = self.client.get(reverse("get_slots", args=[self.room_a.id]), {"date": day.isoformat(), "duration": 30})
+        starts = [slot["start"][11:16] for slot in res.json()]
+        self.assertEqual(starts, ["10:00", "10:30"])
+
+
+class UpdateEventTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.event = Event.objects.create(name="Session", start=at(0), end=at(30), created_by=self.staff)
+        self.url = reverse("update_event", args=[self.event.id])
+        self.client.force_login(self.staff)
+
+    def patch(self, version=None, **payload):
+        headers = {"HTTP_IF_MATCH": f'"{version}"'} if version is not None else {}
+        return self.client.patch(self.url, json.dumps(payload), content_type="application/json", **headers)
+
+    def test_stale_version_is_rejected(self):
+        res = self.patch(version=1, title="Moved")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["ETag"], '"2"')
+        res = self.patch(version=1, title="Lost update")
+        self.assertEqual(res.status_code, 412)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.name, "Moved")
+
+    def test_overlap_uses_final_start_and_end(self):
+        Event.objects.create(name="Taken", start=at(60), end=at(90), created_by=self.staff, is_approved=True)
+        res = self.patch(start=at(40).isoformat(), end=at(70).isoformat())
+        self.assertEqual(res.status_code, 409)
+        res = self.patch(start=at(30).isoformat(), end=at(60).isoformat())
+        self.assertEqual(res.status_code, 200)
+
+    def test_naive_times_use_the_default_timezone(self):
+        res = self.patch(start="2030-01-07T09:10:00")
+        self.assertEqual(res.status_code, 200)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.start, make_aware(datetime(2030, 1, 7, 9, 10)))
+
+    def test_rapid_drags_are_written_and_checked(self):
+        Event.objects.filter(pk=self.event.pk).update(is_approved=True)
+        res = self.patch(version=1, start=at(15).isoformat(), end=at(45).isoformat())
+        self.assertEqual(res.status_code, 200)
+        res = self.patch(version=2, start=at(60).isoformat(), end=at(90).isoformat())
+        self.assertEqual(res.status_code, 200)
+        self.event.refresh_from_db()
+        self.assertEqual((self.event.start, self.event.version), (at(60), 3))
+
+        # The slot is taken as soon as the drag is answered
+        pending = Event.objects.create(name="B", start=at(60), end=at(90), created_by=self.staff)
+        res = self.client.post(reverse("approve_event", args=[pending.id]))
+        self.assertEqual(res.status_code, 409)
+
+
+class EventFeedFormatTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user("staff", password="pw", is_staff=True, first_name="Dr", last_name="Who")
+        self.other = User.objects.create_user("other", password="pw")
+        self.me = User.objects.create_user("me", password="pw")
+        for i in range(200):
+            Event.objects.create(
+                name=f"Session {i}", start=at(i * 60), end=at(i * 60 + 30),
+                created_by=self.other if i % 2 else self.me, is_approved=bool(i % 3),
+            )
+        self.url = reverse("get_events")
+
+    def test_compact_matches_legacy(self):
+        self.client.force_login(self.me)
+        legacy = self.client.get(self.url).json()
+        res = self.client.get(self.url, {"format": "compact"})
+        self.assertEqual(res["Content-Type"], "application/vnd.ortho.events+json")
+        compact = res.json()
+        cols = compact["columns"]
+        self.assertEqual(compact["count"], len(legacy))
+        for i, ev in enumerate(legacy):
+            status = compact["statuses"][cols["status"][i]]
+            self.assertEqual(cols["id"][i], ev["id"])
+            self.assertEqual(cols["title"][i], ev["title"])
+            self.assertEqual(cols["start"][i], int(datetime.fromisoformat(ev["start"]).timestamp()))
+            self.assertEqual(status["color"], ev["backgroundColor"])
+            self.assertEqual(status["isApproved"], ev["isApproved"])
+            creator = cols["creator"][i]
+            self.assertEqual(compact["creators"][creator] if creator >= 0 else None, ev["extendedProps"].get("createdBy"))
+
+    def test_accept_header_selects_compact(self):
+        self.client.force_login(self.staff)
+        res = self.client.get(self.url, HTTP_ACCEPT="application/vnd.ortho.events+json")
+        self.assertEqual(res.json()["format"], "compact/1")
+
+    def test_compact_gzipped_is_much_smaller(self):
+        self.client.force_login(self.staff)
+        legacy = self.client.get(self.url).content
+        compact = self.client.get(self.url, {"format": "compact"}, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(compact["Content-Encoding"], "gzip")
+        self.assertLess(len(compact.content) * 4, len(legacy))
+
+    def test_range_parameters_limit_feed(self):
+        self.client.force_login(self.staff)
+        res = self.client.get(self.url, {"start": at(0).isoformat(), "end": at(180).isoformat()})
+        self.assertEqual(len(res.json()), 3)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.alice = User.objects.create_user("alice", password="pw")
+        self.bob = User.objects.create_user("bob", password="pw")
+        self.match = Event.objects.create(
+            name="Assessment", description="Noted stuttering during the <reading> assessment",
+            start=at(0), end=at(30), created_by=self.alice,
+        )
+        self.title_match = Event.objects.create(
+            name="Stuttering follow-up", description="", start=at(60 * 24 * 30), end=at(60 * 24 * 30 + 30),
+            created_by=self.bob,
+        )
+        Event.objects.create(name="Session", description="Articulation drills", start=at(60), end=at(90), created_by=self.alice)
+        self.url = reverse("search_events")
+        self.client.force_login(self.staff)
+
+    def test_ranked_results_with_snippets(self):
+        res = self.client.get(self.url, {"q": "stutter"}).json()
+        self.assertEqual([r["id"] for r in res], [self.title_match.id, self.match.id])
+        self.assertIn("<mark>stuttering</mark>", res[1]["snippet"])
+        self.assertIn("&lt;reading&gt;", res[1]["snippet"])
+
+    def test_filters_by_client_and_date(self):
+        res = self.client.get(self.url, {"q": "stuttering", "client": self.alice.id}).json()
+        self.assertEqual([r["id"] for r in res], [self.match.id])
+        res = self.client.get(self.url, {"q": "stuttering", "start": at(60 * 24).isoformat()}).json()
+        self.assertEqual([r["id"] for r in res], [self.title_match.id])
+
+    def test_index_follows_updates_and_deletes(self):
+        Event.objects.filter(pk=self.match.pk).update(description="Voice therapy")
+        self.title_match.delete()
+        self.assertEqual(self.client.get(self.url, {"q": "stuttering"}).json(), [])
+        self.assertEqual(len(self.client.get(self.url, {"q": "voice"}).json()), 1)
+
+    def test_limit_is_clamped(self):
+        res = self.client.get(self.url, {"q": "stuttering", "limit": -1}).json()
+        self.assertEqual(len(res), 1)
+
+    def test_unfiltered_search_skips_id_subquery(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url, {"q": "stuttering"})
+        fts = [q["sql"] for q in queries if "events_fts" in q["sql"]]
+        self.assertEqual(len(fts), 1)
+        self.assertNotIn("rowid IN", fts[0])
+
+    def test_query_syntax_is_escaped(self):
+        res = self.client.get(self.url, {"q": 'assess" OR NEAR(*'})
+        self.assertEqual(res.status_code, 200)
+
+    def test_admin_search_uses_index(self):
+        self.staff.is_superuser = True
+        self.staff.save()
+        res = self.client.get(reverse("admin:appointments_event_changelist"), {"q": "stuttering"})
+        self.assertEqual(res.context["cl"].result_count, 2)
+
+
+class ImportEventsTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("alice", email="Alice@example.com")
+        self.bob = User.objects.create_user("bob")
+        Event.objects.create(name="Existing", start=at(0), end=at(60), created_by=self.bob, is_approved=True)
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w") as fh:
+            fh.write(text)
+        return path
+
+    def run_import(self, path, **options):
+        call_command("import_events", path, stdout=open(os.devnull, "w"), **options)
+
+    def test_csv_import_with_sweep_and_error_report(self):
+        path = self.write("sessions.csv", "\n".join([
+            "title,start,end,client,description",
+            f"A,{at(30).isoformat()},{at(90).isoformat()},bob,overlaps existing",
+            f"B,{at(60).isoformat()},{at(120).isoformat()},alice@example.com,ok",
+            f"C,{at(90).isoformat()},{at(150).isoformat()},alice,overlaps B",
+            f"D,{at(150).isoformat()},{at(180).isoformat()},nobody,",
+            f"E,{at(180).isoformat()},{at(210).isoformat()},bob,ok",
+        ]))
+        report = os.path.join(self.dir.name, "errors.csv")
+        self.run_import(path, errors=report, chunk_size=1)
+        self.assertEqual(
+            list(Event.objects.exclude(name="Existing").values_list("name", "created_by__username")),
+            [("B", "alice"), ("E", "bob")],
+        )
+        with open(report) as fh:
+            lines = fh.read().splitlines()
+        self.assertEqual(lines[0], "line,error")
+        self.assertEqual([line.split(",")[0] for line in lines[1:]], ["2", "4", "5"])
+        self.assertFalse(os.path.exists(path + ".checkpoint.json"))
+
+    def test_resumes_after_crash_between_commit_and_checkpoint(self):
+        rows = ["name,start,end,client"] + [
+            f"S{i},{at(100 + i * 30).isoformat()},{at(115 + i * 30).isoformat()},alice" for i in range(5)
+        ] + [f"D,{at(400).isoformat()},{at(430).isoformat()},dave"]
+        path = self.write("sessions.csv", "\n".join(rows))
+
+        # Killed after the second chunk committed, before its checkpoint was saved
+        saves = []
+
+        def save(checkpoint, state):
+            saves.append(state["done"])
+            if len(saves) == 3:
+                raise RuntimeError("killed")
+            save_checkpoint(checkpoint, state)
+
+        with mock.patch("appointments.management.commands.import_events.save_checkpoint", side_effect=save):
+            with self.assertRaises(RuntimeError):
+                self.run_import(path, chunk_size=2)
+        self.assertEqual(Event.objects.exclude(name="Existing").count(), 4)
+
+        # Different options, or a change to who the rows resolve to, is refused
+        with self.assertRaisesMessage(CommandError, "different options"):
+            self.run_import(path, pending=True)
+        dave = User.objects.create_user("dave")
+        with self.assertRaisesMessage(CommandError, "different options"):
+            self.run_import(path)
+        dave.delete()
+
+        # Unrelated signups do not matter
+        User.objects.create_user("carol")
+        self.run_import(path, chunk_size=2)
+        self.assertEqual(
+            list(Event.objects.exclude(name="Existing").values_list("name", flat=True)),
+            ["S0", "S1", "S2", "S3", "S4"],
+        )
+        self.assertFalse(os.path.exists(path + ".checkpoint.json"))
+
+    def test_ics_import(self):
+        path = self.write("export.ics", "\r\n".join([
+            "BEGIN:VCALENDAR",
+            "BEGIN:VEVENT",
+            "SUMMARY:Stuttering assessment",
+            "DESCRIPTION:First session\\, notes\\nsecond line that is folded",
+            "  onto two lines",
+            "DTSTART:20300107T120000Z",
+            "DTEND;TZID=Europe/Paris:20300107T140000",
+            "ATTENDEE;CN=Alice:mailto:alice@example.com",
+            "END:VEVENT",
+            "BEGIN:VEVENT",
+            "SUMMARY:Holiday",
+            "DTSTART;VALUE=DATE:20300108",
+            "DTEND;VALUE=DATE:20300109",
+            "X-ORTHO-CLIENT:bob",
+            "END:VEVENT",
+            "END:VCALENDAR",
+        ]))
+        self.run_import(path)
+        ev = Event.objects.get(name="Stuttering assessment")
+        self.assertEqual((ev.created_by, ev.start, ev.end), (self.alice, at(180), at(240)))
+        self.assertEqual(ev.description, "First session, notes\nsecond line that is folded onto two lines")
+        self.assertTrue(ev.is_approved)
+        self.assertFalse(Event.objects.filter(name="Holiday").exists())
+
+    def test_unknown_time_zones(self):
+        path = self.write("outlook.ics", "\r\n".join([
+            "BEGIN:VEVENT",
+            "SUMMARY:Windows zone",
+            "DTSTART;TZID=W. Europe Standard Time:20300107T120000",
+            "DTEND;TZID=W. Europe Standard Time:20300107T130000",
+            "X-ORTHO-CLIENT:bob",
+            "END:VEVENT",
+            "BEGIN:VEVENT",
+            "SUMMARY:Quoted zone",
+            'DTSTART;TZID="Europe/Paris":20300107T120000',
+            'DTEND;TZID="Europe/Paris":20300107T130000',
+            "X-ORTHO-CLIENT:bob",
+            "END:VEVENT",
+        ]))
+        report = os.path.join(self.dir.name, "errors.csv")
+        self.run_import(path, errors=report)
+        self.assertEqual(list(Event.objects.exclude(name="Existing").values_list("name", flat=True)), ["Quoted zone"])
+        with open(report) as fh:
+            self.assertIn("unknown time zone 'W. Europe Standard Time'", fh.read())
+
+        with self.assertRaisesMessage(CommandError, "unknown time zone"):
+            self.run_import(path, timezone="Mars/Olympus")
+
+
+class ReminderTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user("alice", email="alice@example.com")
+        self.event = Event.objects.create(
+            name="Session", start=at(0), end=at(30), created_by=self.alice,
+            is_approved=True, approved_at=at(-60 * 72),
+        )
+
+    def tick(self, minutes_before_start, **kwargs):
+        return process_due_reminders(now=at(-minutes_before_start), **kwargs)
+
+    def test_sends_each_offset_once(self):
+        self.assertEqual(self.tick(60 * 25)["sent"], 0)
+        self.assertEqual(self.tick(60 * 23)["sent"], 1)
+        self.assertEqual(self.tick(60 * 22)["sent"], 0)
+        self.assertEqual(self.tick(60)["sent"], 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ["alice@example.com"])
+        self.assertEqual(
+            sorted(Reminder.objects.values_list("offset", "status")),
+            [(timedelta(hours=2), "sent"), (timedelta(hours=24), "sent")],
+        )
+
+    def test_concurrent_workers_do_not_double_send(self):
+        now = at(-60 * 3)
+        self.assertEqual(claim_due(now, "worker-a"), 1)
+        self.assertEqual(claim_due(now, "worker-b"), 0)
+        deliver_claimed(now, "worker-a")
+        deliver_claimed(now, "worker-b")
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(set(Reminder.objects.values_list("claimed_by", flat=True)), {"worker-a"})
+
+    def test_late_worker_sends_only_the_closest_reminder(self):
+        self.assertEqual(self.tick(60)["sent"], 1)
+        self.assertEqual(list(Reminder.objects.values_list("offset", flat=True)), [timedelta(hours=2)])
+
+        # A 24h reminder still waiting when the 2h one falls due is dropped
+        Reminder.objects.all().delete()
+        claim_due(at(-60 * 3), "slow")
+        self.assertEqual(deliver_claimed(at(-60), "slow")["cancelled"], 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_sends_back_off(self):
+        start = at(-100)
+        with mock.patch("appointments.reminders.send_reminder", side_effect=OSError("smtp down")):
+            for seconds in (0, 30, 60):
+                process_due_reminders(now=start + timedelta(seconds=seconds), token="worker")
+            reminder = Reminder.objects.get()
+            self.assertEqual((reminder.attempts, reminder.status), (1, "claimed"))
+            self.assertEqual(reminder.next_attempt_at, start + timedelta(minutes=5))
+
+            process_due_reminders(now=start + timedelta(minutes=5), token="worker")
+            process_due_reminders(now=start + timedelta(minutes=10), token="worker")
+            reminder.refresh_from_db()
+            self.assertEqual(reminder.attempts, 2)
+
+            process_due_reminders(now=start + timedelta(minutes=15), token="worker")
+            reminder.refresh_from_db()
+            self.assertEqual((reminder.attempts, reminder.status, reminder.last_error), (3, "failed", "smtp down"))
+
+    def test_late_approval_skips_earlier_offsets(self):
+        self.event.approved_at = at(-60 * 5)
+        self.event.save()
+        self.tick(60)
+        self.assertEqual(list(Reminder.objects.values_list("offset", flat=True)), [timedelta(hours=2)])
+
+    def test_moved_event_gets_a_new_reminder(self):
+        self.tick(60)
+        Event.objects.filter(pk=self.event.pk).update(start=at(30), end=at(60))
+        self.tick(60)
+        self.assertEqual(Reminder.objects.filter(offset=timedelta(hours=2)).count(), 2)
+
+    def test_stale_claims_are_taken_over(self):
+        claim_due(at(-60), "crashed")
+        # Still within the claim timeout: nobody else touches them
+        self.assertEqual(self.tick(60 - 5)["sent"], 0)
+        self.assertEqual(self.tick(60 - 30, token="rescuer")["sent"], 1)
+        self.assertEqual(set(Reminder.objects.values_list("claimed_by", "status")), {("rescuer", "sent")})
+
+    def test_rows_taken_over_mid_batch_are_left_alone(self):
+        Event.objects.create(
+            name="Later", start=at(10), end=at(40), created_by=self.alice,
+            is_approved=True, approved_at=at(-60 * 72),
+        )
+        claim_due(at(-60), "slow")
+        connections = []
+
+        def send(reminder, connection=None):
+            connections.append(connection)
+            # The batch overran the claim timeout: another worker took the rest
+            Reminder.objects.exclude(pk=reminder.pk).update(claimed_by="rescuer")
+
+        with mock.patch("appointments.reminders.send_reminder", side_effect=send):
+            counts = deliver_claimed(at(-60), "slow")
+        self.assertEqual((counts["sent"], len(connections)), (1, 1))
+        self.assertEqual(
+            sorted(Reminder.objects.values_list("claimed_by", "status")),
+            [("rescuer", "claimed"), ("slow", "sent")],
+        )
 
-# Create your tests here.
+    def test_batch_shares_one_mail_connection(self):
+        Event.objects.create(
+            name="Later", start=at(10), end=at(40), created_by=self.alice,
+            is_approved=True, approved_at=at(-60 * 72),
+        )
+        with mock.patch("appointments.reminders.get_connection", wraps=get_connection) as opened:
+            self.assertEqual(self.tick(60)["sent"], 2)
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(len(mail.outbox), 2)
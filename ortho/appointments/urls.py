@@ -1,6 +1,6 @@
 # In your calendar app's urls.py
 from django.urls import path
-from .views import get_events,update_event,calendar_view,delete_event,approve_event,get_users
+from .views import get_events,update_event,calendar_view,delete_event,approve_event,get_users,auto_schedule,get_resources,get_slots,search_view
 
 urlpatterns = [
     path('', calendar_view, name='calendar'),
@@ -8,5 +8,9 @@ urlpatterns = [
     path('events/update/<int:pk>/', update_event, name='update_event'),
     path('events/delete/<int:pk>/', delete_event, name='delete_event'),
     path('events/approve/<int:pk>/', approve_event, name='approve_event'),
+    path('events/auto-schedule/', auto_schedule, name='auto_schedule'),
+    path('events/search/', search_view, name='search_events'),
+    path('resources/', get_resources, name='get_resources'),
+    path('resources/<int:pk>/slots/', get_slots, name='get_slots'),
     path('users/', get_users, name='get_users'),  # NEW: Add this line
 ]
\ No newline at end of file
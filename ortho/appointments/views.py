@@ -1,13 +1,22 @@
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponseBadRequest
 from django.contrib.auth.decorators import login_required
-from django.utils.timezone import now
+from django.views.decorators.gzip import gzip_page
+from django.utils.timezone import is_naive, make_aware, now
 from django.core.mail import send_mail
 from django.conf import settings
-from django.db.models import Q
+from ortho.ratelimit import ratelimit
+from ortho.db_router import read_replica
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils.dateparse import parse_datetime
-from datetime import datetime
-from .models import Event
+from django.utils.dateparse import parse_date
+from datetime import datetime, timedelta
+from .models import Event, Resource
+from .scheduler import apply_schedule, lock_event_writes
+from .feed import events_response
+from .search import search_events
+from .slots import available_slots
 import json
 
 
@@ -18,10 +27,28 @@ def calendar_view(request):
         if request.user.is_staff
         else "appointments/client_calendar.html"
     )
-    return render(request, template)
+    # Drags of one event within this window are sent as a single update
+    window = getattr(settings, "EVENT_UPDATE_COALESCE_WINDOW", 1.0)
+    return render(request, template, {"update_coalesce_ms": int(window * 1000)})
+
+
+def parse_range_bound(value):
+    """Parse a FullCalendar range parameter ('+' in the offset may arrive as a space)."""
+    if not value:
+        return None
+    try:
+        dt = parse_datetime(value.replace(" ", "+"))
+    except ValueError:
+        return None
+    if dt and is_naive(dt):
+        dt = make_aware(dt)
+    return dt
 
 
 @login_required
+@ratelimit("booking")
+@gzip_page
+@read_replica
 def get_events(request):
 
     # --------------------------------------------------------
@@ -39,45 +66,24 @@ def get_events(request):
                 Q(is_approved=True) | Q(created_by=request.user)
             )
 
-        events = []
-        for ev in queryset:
-            # Color coding: green for approved, yellow for pending
-            bg = "#198754" if ev.is_approved else "#ffc107"
-            
-            # For non-staff users, hide sensitive info for other people's appointments
-            if not request.user.is_staff and ev.is_approved and ev.created_by != request.user:
-                # Show only that the slot is booked
-                events.append({
-                    "id": ev.id,
-                    "title": "Booked",  # Generic title
-                    "start": ev.start.isoformat(),
-                    "end": ev.end.isoformat(),
-                    "description": "",  # Hide description
-                    "isApproved": ev.is_approved,
-                    "backgroundColor": bg,
-                    "borderColor": bg,
-                    "extendedProps": {
-                        "isOwnEvent": False,
-                    }
-                })
-            else:
-                # Staff or own events: show full details
-                events.append({
-                    "id": ev.id,
-                    "title": ev.name,
-                    "start": ev.start.isoformat(),
-                    "end": ev.end.isoformat(),
-                    "description": ev.description or "",
-                    "isApproved": ev.is_approved,
-                    "backgroundColor": bg,
-                    "borderColor": bg,
-                    "extendedProps": {
-                        "isOwnEvent": ev.created_by == request.user,
-                        "createdBy": ev.created_by.get_full_name() or ev.created_by.username,
-                    }
-                })
-
-        return JsonResponse(events, safe=False)
+        # Optional per-resource feed (practitioner or room)
+        resource_id = request.GET.get("resource")
+        if resource_id:
+            if not resource_id.isdigit():
+                return HttpResponseBadRequest("Invalid resource")
+            queryset = queryset.filter(resource_id=resource_id)
+
+        # FullCalendar sends the visible range; only load that window
+        range_start = parse_range_bound(request.GET.get("start"))
+        range_end = parse_range_bound(request.GET.get("end"))
+        if range_start:
+            queryset = queryset.filter(end__gt=range_start)
+        if range_end:
+            queryset = queryset.filter(start__lt=range_end)
+
+        queryset = queryset.select_related("created_by")
+
+        return events_response(request, queryset)
 
     # --------------------------------------------------------
     # POST: create new event
@@ -96,6 +102,7 @@ def get_events(request):
         description = data.get("description", "")
         user_id = data.get("user_id")  # For admin assignment
         auto_approve = data.get("auto_approve", False)
+        resource_id = data.get("resource_id")
 
         if not title or not start_str or not end_str:
             return HttpResponseBadRequest("Missing required fields")
@@ -107,8 +114,20 @@ def get_events(request):
         if not start_dt or not end_dt:
             return HttpResponseBadRequest("Invalid ISO datetime format")
 
-        # Check for overlapping APPROVED appointments (for all users)
-        if is_overlapping(start_dt, end_dt):
+        if resource_id is not None:
+            try:
+                resource_id = int(resource_id)
+            except (TypeError, ValueError):
+                return HttpResponseBadRequest("Invalid resource")
+
+        if resource_id is not None and not Resource.objects.filter(id=resource_id, is_active=True).exists():
+            return JsonResponse(
+                {"status": "error", "message": "Resource not found."},
+                status=404
+            )
+
+        # Check for overlapping APPROVED appointments on the same resource
+        if is_overlapping(start_dt, end_dt, resource=resource_id):
             return JsonResponse(
                 {"status": "error", "message": "This time slot is already booked."},
                 status=409
@@ -139,6 +158,7 @@ def get_events(request):
             end=end_dt,
             description=description,
             created_by=target_user,
+            resource_id=resource_id,
             is_approved=should_approve,
             approved_at=now() if should_approve else None,
         )
@@ -151,6 +171,7 @@ def get_events(request):
                 "end": event.end.isoformat(),
                 "description": event.description or "",
                 "isApproved": event.is_approved,
+                "resourceId": event.resource_id,
             },
             status=201,
         )
@@ -159,6 +180,41 @@ def get_events(request):
         return HttpResponseBadRequest("Unsupported method")
 
 
+def parse_if_match(request):
+    """Version number sent in If-Match (ETag form "3" or W/"3"), or None."""
+    header = request.headers.get("If-Match")
+    if not header or header.strip() == "*":
+        return None
+    value = header.strip()
+    if value.startswith("W/"):
+        value = value[2:]
+    value = value.strip('"')
+    return int(value) if value.isdigit() else -1
+
+
+def versioned_response(payload, version, status=200):
+    response = JsonResponse(payload, status=status)
+    response["ETag"] = f'"{version}"'
+    return response
+
+
+def write_changes(event, changes):
+    """
+    Persist ``changes`` (field -> value) if ``event.version`` is still current.
+    Only the changed columns and the version are written. Returns the new
+    version, or None when someone else wrote the row in the meantime.
+    """
+    rows = Event.objects.filter(pk=event.pk, version=event.version).update(
+        version=F("version") + 1, **changes
+    )
+    if not rows:
+        return None
+    for field, value in changes.items():
+        setattr(event, field, value)
+    event.version += 1
+    return event.version
+
+
 @login_required
 def update_event(request, pk):
     event = get_object_or_404(Event, pk=pk)
@@ -174,35 +230,72 @@ def update_event(request, pk):
     except:
         return HttpResponseBadRequest("Invalid JSON")
 
+    expected = parse_if_match(request)
+    if expected is not None and expected != event.version:
+        return versioned_response(
+            {"error": "Appointment was changed by someone else", "version": event.version},
+            event.version,
+            status=412,
+        )
+
     title = data.get("title") or data.get("name")
     start_str = data.get("start")
     end_str = data.get("end")
     description = data.get("description")
 
+    changes = {}
     if title is not None:
-        event.name = title
+        changes["name"] = title
 
     if start_str is not None:
         new_start = parse_datetime(start_str)
         if not new_start:
             return HttpResponseBadRequest("Invalid start datetime")
-
-        if is_overlapping(new_start, event.end, exclude_id=event.id):
-            return JsonResponse({"error": "Timeslot unavailable"}, status=409)
-
-        event.start = new_start
+        if is_naive(new_start):
+            new_start = make_aware(new_start)
+        changes["start"] = new_start
 
     if end_str is not None:
         new_end = parse_datetime(end_str)
         if not new_end:
             return HttpResponseBadRequest("Invalid end datetime")
-        event.end = new_end
+        if is_naive(new_end):
+            new_end = make_aware(new_end)
+        changes["end"] = new_end
 
     if description is not None:
-        event.description = description
-
-    event.save()
-    return JsonResponse({"status": "updated", "id": event.id})
+        changes["description"] = description
+
+    # Only keep columns whose value actually changes
+    changes = {field: value for field, value in changes.items() if getattr(event, field) != value}
+
+    if not changes:
+        return versioned_response({"status": "unchanged", "id": event.id, "version": event.version}, event.version)
+
+    # Check the final start/end pair, not each bound on its own
+    start = changes.get("start", event.start)
+    end = changes.get("end", event.end)
+    moved = "start" in changes or "end" in changes
+    if moved and end <= start:
+        return HttpResponseBadRequest("End must be after start")
+
+    # Check and write under the write lock so an approval cannot take the
+    # slot in between
+    with transaction.atomic():
+        if moved:
+            lock_event_writes()
+            if is_overlapping(start, end, exclude_id=event.id, resource=event.resource_id):
+                return JsonResponse({"error": "Timeslot unavailable"}, status=409)
+        version = write_changes(event, changes)
+
+    if version is None:
+        event.refresh_from_db()
+        return versioned_response(
+            {"error": "Appointment was changed by someone else", "version": event.version},
+            event.version,
+            status=412,
+        )
+    return versioned_response({"status": "updated", "id": event.id, "version": version}, version)
 
 
 @login_required
@@ -224,18 +317,23 @@ def approve_event(request, pk):
     if not request.user.is_staff:
         return HttpResponseForbidden()
 
-    event = get_object_or_404(Event, pk=pk)
-    
-    # Check if approving this event would create an overlap
-    if is_overlapping(event.start, event.end, exclude_id=event.id):
-        return JsonResponse(
-            {"status": "error", "message": "Cannot approve: time slot conflicts with another approved appointment."},
-            status=409
-        )
-    
-    event.is_approved = True
-    event.approved_at = now()
-    event.save()
+    # Check and approve under the write lock so a concurrent approval
+    # (e.g. the auto-scheduler) cannot take the slot in between
+    with transaction.atomic():
+        lock_event_writes()
+        event = get_object_or_404(Event, pk=pk)
+
+        # Check if approving this event would create an overlap
+        if is_overlapping(event.start, event.end, exclude_id=event.id, resource=event.resource_id):
+            return JsonResponse(
+                {"status": "error", "message": "Cannot approve: time slot conflicts with another approved appointment."},
+                status=409
+            )
+
+        event.is_approved = True
+        event.approved_at = now()
+        event.version += 1
+        event.save(update_fields=["is_approved", "approved_at", "version"])
 
     if event.created_by.email:
         send_mail(
@@ -249,18 +347,136 @@ def approve_event(request, pk):
     return JsonResponse({"status": "approved", "id": event.id})
 
 
-def is_overlapping(start, end, exclude_id=None):
+@login_required
+def auto_schedule(request):
+    """
+    Approve the best conflict-free subset of pending events in a window.
+    POST JSON: {"start": iso, "end": iso, "dry_run": bool}, all optional.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    if request.method != "POST":
+        return HttpResponseBadRequest("Unsupported method")
+
+    try:
+        data = json.loads(request.body.decode("utf-8") or "{}")
+    except json.JSONDecodeError:
+        return HttpResponseBadRequest("Invalid JSON payload")
+
+    window = {}
+    for key in ("start", "end"):
+        if data.get(key):
+            window[key] = parse_datetime(data[key])
+            if not window[key]:
+                return HttpResponseBadRequest("Invalid ISO datetime format")
+
+    dry_run = bool(data.get("dry_run", False))
+    schedule = apply_schedule(window.get("start"), window.get("end"), dry_run=dry_run)
+
+    return JsonResponse({
+        "status": "preview" if dry_run else "scheduled",
+        "approved": schedule.approved,
+        "rejected": schedule.rejected,
+    })
+
+
+@login_required
+@read_replica
+def search_view(request):
+    """
+    Staff full-text search over appointment titles and descriptions.
+    GET params: q (required), start, end (ISO datetimes), client (user id), limit.
+    """
+    if not request.user.is_staff:
+        return HttpResponseForbidden()
+
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return HttpResponseBadRequest("Missing search query")
+
+    queryset = Event.objects.all()
+    range_start = parse_range_bound(request.GET.get("start"))
+    range_end = parse_range_bound(request.GET.get("end"))
+    if range_start:
+        queryset = queryset.filter(end__gt=range_start)
+    if range_end:
+        queryset = queryset.filter(start__lt=range_end)
+
+    client_id = request.GET.get("client")
+    if client_id:
+        if not client_id.isdigit():
+            return HttpResponseBadRequest("Invalid client")
+        queryset = queryset.filter(created_by_id=client_id)
+
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 50)), 200))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid limit")
+
+    results = search_events(query, queryset, limit=limit)
+
+    # Attach the fields the staff UI needs in one query
+    events = Event.objects.select_related("created_by").in_bulk([r["id"] for r in results])
+    for result in results:
+        ev = events[result["id"]]
+        result.update({
+            "start": ev.start.isoformat(),
+            "end": ev.end.isoformat(),
+            "isApproved": ev.is_approved,
+            "createdBy": ev.created_by.get_full_name() or ev.created_by.username,
+        })
+
+    return JsonResponse(results, safe=False)
+
+
+def is_overlapping(start, end, exclude_id=None, resource=None):
     """
-    Check if the given time slot overlaps with any APPROVED appointments.
+    Check if the given time slot overlaps with any APPROVED appointments
+    of the same resource. Events without a resource share one timeline.
     This ensures users can't book over already approved appointments.
     """
-    qs = Event.objects.filter(start__lt=end, end__gt=start, is_approved=True)
+    qs = Event.objects.filter(resource_id=resource, start__lt=end, end__gt=start, is_approved=True)
     if exclude_id:
         qs = qs.exclude(id=exclude_id)
     return qs.exists()
 
 
 @login_required
+def get_resources(request):
+    """Return active practitioners/rooms for the calendar resource picker."""
+    resources = Resource.objects.filter(is_active=True).values('id', 'name')
+    return JsonResponse(list(resources), safe=False)
+
+
+@login_required
+def get_slots(request, pk):
+    """
+    Return free slots of one resource for a day.
+    GET params: date (YYYY-MM-DD), duration (minutes, default 30).
+    """
+    resource = get_object_or_404(Resource, pk=pk, is_active=True)
+
+    day = parse_date(request.GET.get("date", ""))
+    if not day:
+        return HttpResponseBadRequest("Invalid date")
+
+    try:
+        minutes = int(request.GET.get("duration", 30))
+    except ValueError:
+        return HttpResponseBadRequest("Invalid duration")
+    if minutes <= 0:
+        return HttpResponseBadRequest("Invalid duration")
+
+    slots = available_slots(resource, day, timedelta(minutes=minutes))
+    return JsonResponse(
+        [{"start": s.isoformat(), "end": e.isoformat()} for s, e in slots],
+        safe=False,
+    )
+
+
+@login_required
+@read_replica
 def get_users(request):
     """
     Return list of non-staff, non-admin users for admin to assign appointments.
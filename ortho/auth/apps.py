@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class AuthConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'auth'
+    # "auth" is taken by django.contrib.auth
+    label = 'ortho_auth'
+
+    def ready(self):
+        # Connect the user cache invalidation signals
+        from . import signals  # noqa: F401
@@ -0,0 +1,55 @@
+"""
+Per-request user lookup served from the cache.
+
+``CachedAuthenticationMiddleware`` replaces Django's AuthenticationMiddleware:
+the logged-in user is read from the cache and only fetched from the database
+on a miss. The session auth hash is still checked on every request, so a
+password change logs other sessions out exactly like the stock middleware.
+Cached entries are dropped whenever the user is saved, deleted or logs out
+(see auth/signals.py). Bulk ``QuerySet.update()`` calls bypass those signals;
+entries then expire after ``USER_CACHE_TIMEOUT`` seconds.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+
+def user_cache():
+    return caches[getattr(settings, "USER_CACHE", "default")]
+
+
+def user_cache_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def get_user(request):
+    user_id = request.session.get(SESSION_KEY)
+    backend_path = request.session.get(BACKEND_SESSION_KEY)
+    if user_id is not None and backend_path in settings.AUTHENTICATION_BACKENDS:
+        user = user_cache().get(user_cache_key(user_id))
+        session_hash = request.session.get(HASH_SESSION_KEY)
+        if (
+            user is not None
+            and session_hash
+            and constant_time_compare(session_hash, user.get_session_auth_hash())
+        ):
+            user.backend = backend_path
+            return user
+
+    # Miss or unverified hash: let Django resolve (and flush) the session.
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        user_cache().set(
+            user_cache_key(user.pk), user, getattr(settings, "USER_CACHE_TIMEOUT", 300)
+        )
+    return user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
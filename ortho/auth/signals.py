@@ -0,0 +1,19 @@
+"""Drop cached users (auth/middleware.py) when they change or log out."""
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .middleware import user_cache, user_cache_key
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user(sender, instance, **kwargs):
+    user_cache().delete(user_cache_key(instance.pk))
+
+
+@receiver(user_logged_out)
+def invalidate_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        user_cache().delete(user_cache_key(user.pk))
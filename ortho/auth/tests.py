@@ -1,3 +1,120 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ortho.ratelimit import consume, parse_rate
+
+
+LOCMEM = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+@override_settings(CACHES=LOCMEM, RATELIMITS={"login": "3/m"})
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_blocks_after_burst(self):
+        url = reverse("login")
+        for _ in range(3):
+            res = self.client.post(url, {"username": "x", "password": "y"})
+            self.assertEqual(res.status_code, 200)
+        res = self.client.post(url, {"username": "x", "password": "y"})
+        self.assertEqual(res.status_code, 429)
+        self.assertTrue(0 < int(res["Retry-After"]) <= 20)
+
+    def test_get_is_not_counted(self):
+        url = reverse("login")
+        for _ in range(5):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_clients_have_separate_buckets(self):
+        url = reverse("login")
+        for _ in range(4):
+            self.client.post(url, REMOTE_ADDR="10.0.0.1")
+        res = self.client.post(url, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(res.status_code, 200)
+
+
+@override_settings(CACHES=LOCMEM)
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10/m"), (10, 60.0))
+        self.assertEqual(parse_rate("5/15m"), (5, 900.0))
+
+    def test_refills_over_time(self):
+        clock = [1000.0]
+        for _ in range(2):
+            self.assertEqual(consume("t", "a", "2/s", clock=lambda: clock[0]), 0)
+        self.assertGreater(consume("t", "a", "2/s", clock=lambda: clock[0]), 0)
+        clock[0] += 0.5
+        self.assertEqual(consume("t", "a", "2/s", clock=lambda: clock[0]), 0)
+
+    def test_concurrent_hits_are_each_counted(self):
+        allowed = []
+        barrier = threading.Barrier(20)
+
+        def hit():
+            barrier.wait()
+            allowed.append(consume("burst", "a", "5/h") == 0)
+
+        threads = [threading.Thread(target=hit) for _ in range(20)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(allowed.count(True), 5)
+
+
+@override_settings(CACHES=LOCMEM, RATELIMITS={"booking": "2/m"})
+class BookingThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("client", password="pw")
+        self.client.force_login(self.user)
+
+    def test_booking_posts_are_throttled_per_user(self):
+        url = reverse("get_events")
+        for _ in range(2):
+            res = self.client.post(url, "{}", content_type="application/json")
+            self.assertEqual(res.status_code, 400)
+        res = self.client.post(url, "{}", content_type="application/json")
+        self.assertEqual(res.status_code, 429)
+        self.assertIn("Retry-After", res)
+        # The feed itself is not counted
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class CachedAuthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.client.force_login(self.staff)
+
+    def test_steady_state_costs_no_auth_queries(self):
+        url = reverse("get_users")
+        with self.assertNumQueries(2):
+            # cold: user row + the view's own query (session is already cached)
+            self.client.get(url)
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+    def test_user_save_invalidates_cache(self):
+        url = reverse("get_users")
+        self.client.get(url)
+        self.staff.is_staff = False
+        self.staff.save()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_password_change_logs_out_cached_session(self):
+        url = reverse("get_users")
+        self.client.get(url)
+        self.staff.set_password("changed")
+        self.staff.save()
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 302)
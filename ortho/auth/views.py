@@ -2,9 +2,11 @@ from django.contrib.auth import authenticate, login
 from django.shortcuts import render, redirect
 # from django.contrib.auth.models import User
 from django.contrib.auth import get_user_model
+from ortho.ratelimit import ratelimit, ip
 
 User = get_user_model()
 
+@ratelimit("login", key=ip)
 def login_view(request):
     if request.method == "POST":
         username =request.POST.get("username") or None
@@ -16,6 +18,7 @@ def login_view(request):
 
     return render(request,"auth/login.html",{})
 
+@ratelimit("register", key=ip)
 def regiser_view(request):
     if request.method == "POST":
         username =request.POST.get("username") or None
@@ -0,0 +1,125 @@
+"""
+Primary/replica database routing.
+
+Writes always go to ``default``. Reads go to the ``replica`` alias only
+inside views wrapped with ``read_replica`` (calendar feeds, user lists,
+reports), and only for GET/HEAD requests. A user who just wrote something is
+pinned to the primary by ``ReplicaPinMiddleware`` for
+``REPLICA_STICKY_SECONDS``, and at least ``REPLICA_MAX_LAG``, so they always
+read their own writes.
+
+Locally the replica is a SQLite copy of the primary refreshed with
+``python manage.py sync_replica``. Until that copy exists, or when it has not
+been refreshed for ``REPLICA_MAX_LAG`` seconds, reads stay on the primary.
+"""
+import os
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+PRIMARY = "default"
+REPLICA = "replica"
+
+_use_replica = ContextVar("use_replica", default=False)
+
+
+def using_replica():
+    """True inside a ``read_replica`` view that is not pinned to the primary."""
+    return _use_replica.get()
+
+
+def replica_available():
+    config = settings.DATABASES.get(REPLICA)
+    if config is None:
+        return False
+    primary = connections[PRIMARY].settings_dict
+    replica = connections[REPLICA].settings_dict
+    if replica["NAME"] == primary["NAME"]:
+        # Test mirror (or misconfiguration): same database, reuse the primary connection
+        return False
+    if replica["ENGINE"].endswith("sqlite3"):
+        return sqlite_replica_fresh(replica["NAME"])
+    return True
+
+
+def max_lag():
+    return getattr(settings, "REPLICA_MAX_LAG", 60)
+
+
+def pin_seconds():
+    # A replica that is still in use can be up to max_lag() behind
+    return max(getattr(settings, "REPLICA_STICKY_SECONDS", 15), max_lag())
+
+
+def sqlite_replica_fresh(path, clock=time.time):
+    """True if the SQLite copy at ``path`` was refreshed within ``REPLICA_MAX_LAG``."""
+    try:
+        modified = os.path.getmtime(path)
+    except OSError:
+        return False
+    return clock() - modified <= max_lag()
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if using_replica() and replica_available():
+            return REPLICA
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+def _pin_key(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"db:pin:user:{user.pk}"
+    session = getattr(request, "session", None)
+    if session is not None and session.session_key:
+        return f"db:pin:session:{session.session_key}"
+    return None
+
+
+def is_pinned(request):
+    key = _pin_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+def read_replica(view):
+    """Serve the view's GET/HEAD reads from the replica."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD") or is_pinned(request):
+            return view(request, *args, **kwargs)
+        token = _use_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapped
+
+
+class ReplicaPinMiddleware:
+    """Pin the client to the primary for a while after a successful write."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+            key = _pin_key(request)
+            if key is not None:
+                cache.set(key, True, pin_seconds())
+        return response
@@ -0,0 +1,112 @@
+"""
+Token-bucket throttling backed by the Django cache framework.
+
+Each (scope, client) pair owns a bucket of ``count`` tokens that refills at
+``count / period`` tokens per second. A request spends one token; when the
+bucket is empty the view is skipped and a 429 with ``Retry-After`` is
+returned. Rates come from ``settings.RATELIMITS`` so they can be tuned per
+deployment without touching the views.
+"""
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Seconds to wait for a busy bucket, and lifetime of a lock left by a dead process
+LOCK_WAIT = 0.05
+LOCK_TIMEOUT = 1
+
+DEFAULT_RATES = {
+    "booking": "30/m",
+    "login": "10/m",
+    "register": "5/h",
+}
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60.0)"""
+    count, _, period = rate.partition("/")
+    return int(count), float(PERIODS[period[-1]] * int(period[:-1] or 1))
+
+
+def get_rate(scope):
+    rates = getattr(settings, "RATELIMITS", {})
+    return rates.get(scope, DEFAULT_RATES.get(scope))
+
+
+def client_ip(request):
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def user_or_ip(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{client_ip(request)}"
+
+
+def ip(request):
+    return f"ip:{client_ip(request)}"
+
+
+def consume(scope, ident, rate, clock=time.time):
+    """
+    Take one token from the bucket. Returns 0 when allowed, otherwise the
+    number of seconds until a token becomes available.
+
+    The read-modify-write runs under a per-bucket lock taken with
+    ``cache.add`` (atomic on every Django cache backend), so concurrent hits
+    are each counted. If the lock stays busy for ``LOCK_WAIT`` the hit is
+    refused: heavy contention on one bucket is itself a burst.
+    """
+    capacity, period = parse_rate(rate)
+    refill = capacity / period
+    cache = caches[getattr(settings, "RATELIMIT_CACHE", "default")]
+    key = f"rl:{scope}:{ident}"
+    lock = f"{key}:lock"
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while not cache.add(lock, 1, LOCK_TIMEOUT):
+        if time.monotonic() > deadline:
+            return 1.0
+        time.sleep(0.001)
+
+    try:
+        now = clock()
+        tokens, stamp = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - stamp) * refill)
+
+        if tokens < 1:
+            cache.set(key, (tokens, now), math.ceil(period))
+            return (1 - tokens) / refill
+
+        cache.set(key, (tokens - 1, now), math.ceil(period))
+        return 0
+    finally:
+        cache.delete(lock)
+
+
+def ratelimit(scope, key=user_or_ip, methods=("POST",)):
+    """
+    Throttle a view. ``key`` maps the request to a client identifier and
+    only requests whose method is in ``methods`` are counted.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            rate = get_rate(scope)
+            if rate and request.method in methods:
+                wait = consume(scope, key(request), rate)
+                if wait:
+                    response = HttpResponse("Too many requests", status=429)
+                    response["Retry-After"] = str(math.ceil(wait))
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
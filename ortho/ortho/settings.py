@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from datetime import timedelta
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -40,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'website',
+    'auth.apps.AuthConfig',
     "allauth_ui",
     'allauth',
     'allauth.account',
@@ -58,11 +60,13 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Cache-backed drop-in for django.contrib.auth's AuthenticationMiddleware
+    'auth.middleware.CachedAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # Add the account middleware:
     "allauth.account.middleware.AccountMiddleware",
+    'ortho.db_router.ReplicaPinMiddleware',
 ]
 
 ROOT_URLCONF = 'ortho.urls'
@@ -92,9 +96,56 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+    },
+    # Read-only copy for feeds and reports, refreshed by `manage.py sync_replica`
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db-replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+}
+
+DATABASE_ROUTERS = ['ortho.db_router.PrimaryReplicaRouter']
+
+# Keep a user on the primary this long after they write (read-your-writes);
+# never less than REPLICA_MAX_LAG below
+REPLICA_STICKY_SECONDS = 15
+
+# Fall back to the primary when the replica copy is older than this (seconds),
+# e.g. when `sync_replica --interval` is not running
+REPLICA_MAX_LAG = 60
+
+
+# Cache
+# Use a shared backend (Redis/Memcached) when running several worker processes,
+# otherwise each process keeps its own copy of sessions and users.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'ortho-default',
     }
 }
 
+# Sessions are read from the cache and written through to the database
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Logged-in users are cached by auth.middleware (seconds)
+USER_CACHE = 'default'
+USER_CACHE_TIMEOUT = 300
+
+# The admin calendar sends drags of the same event within this many seconds
+# as one update; every update it sends is written straight away. 0 disables it
+EVENT_UPDATE_COALESCE_WINDOW = 1.0
+
+# Appointment reminders (`manage.py send_reminders`): sent this long before
+# each approved event; claims older than the timeout are taken over by another
+# worker; failed sends are retried after the delay, doubling on each attempt
+REMINDER_OFFSETS = [timedelta(hours=24), timedelta(hours=2)]
+REMINDER_CLAIM_TIMEOUT = timedelta(minutes=10)
+REMINDER_RETRY_DELAY = timedelta(minutes=5)
+REMINDER_MAX_ATTEMPTS = 3
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -179,4 +230,12 @@ EMAIL_HOST_USER = "httyd2019@gmail.com"
 EMAIL_HOST_PASSWORD ="voxm zxmj vsqh usgr"
 
 # settings.py
-LOGIN_REDIRECT_URL = '/clients/profile/'
\ No newline at end of file
+LOGIN_REDIRECT_URL = '/clients/profile/'
+
+# Token-bucket throttling (see ortho/ratelimit.py), "<count>/<period>"
+RATELIMIT_CACHE = "default"
+RATELIMITS = {
+    "booking": "30/m",
+    "login": "10/m",
+    "register": "5/h",
+}
\ No newline at end of file
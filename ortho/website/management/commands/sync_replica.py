@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database to the local replica (stand-in for real replication)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Keep running and refresh the replica every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES["default"]
+        replica = settings.DATABASES.get("replica")
+        if replica is None:
+            raise CommandError("No 'replica' database is configured")
+        if not (primary["ENGINE"].endswith("sqlite3") and replica["ENGINE"].endswith("sqlite3")):
+            raise CommandError("sync_replica only copies SQLite databases")
+
+        while True:
+            self.copy(str(primary["NAME"]), str(replica["NAME"]))
+            if not options["interval"]:
+                break
+            time.sleep(options["interval"])
+
+    def copy(self, source, target):
+        # Back up into a temporary file and swap it in, so readers never see
+        # a half-written replica.
+        tmp = f"{target}.tmp"
+        src = sqlite3.connect(source)
+        dst = sqlite3.connect(tmp)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        os.replace(tmp, target)
+        self.stdout.write(f"Replica refreshed from {source}")
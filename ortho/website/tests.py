@@ -1,3 +1,78 @@
-from django.test import TestCase
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+
+from appointments.models import Event
+from ortho import db_router
+from ortho.db_router import PrimaryReplicaRouter, read_replica, using_replica
+
+
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.user = User.objects.create_user("client", password="pw")
+        self.seen = []
+
+        @read_replica
+        def view(request):
+            self.seen.append(using_replica())
+
+        self.view = view
+
+    def request(self, method="get"):
+        request = getattr(self.factory, method)("/")
+        request.user = self.user
+        return request
+
+    def test_reads_go_to_replica_in_read_only_views(self):
+        self.view(self.request())
+        self.assertEqual(self.seen, [True])
+        self.assertFalse(using_replica())
+
+    def test_writes_always_go_to_primary(self):
+        self.view(self.request("post"))
+        self.assertEqual(self.seen, [False])
+        self.assertEqual(PrimaryReplicaRouter().db_for_write(Event), "default")
+
+    def test_user_who_just_wrote_reads_primary(self):
+        self.client.force_login(self.user)
+        self.client.post("/calendar/events/all/", "{}", content_type="application/json")
+        # A rejected write does not pin
+        self.assertFalse(db_router.is_pinned(self.request()))
+
+        self.client.post(
+            "/calendar/events/all/",
+            '{"title": "x", "start": "2030-01-01T09:00:00Z", "end": "2030-01-01T09:30:00Z"}',
+            content_type="application/json",
+        )
+        self.assertTrue(db_router.is_pinned(self.request()))
+        self.view(self.request())
+        self.assertEqual(self.seen, [False])
+
+    def test_test_mirror_reads_use_primary_connection(self):
+        token = db_router._use_replica.set(True)
+        try:
+            self.assertEqual(PrimaryReplicaRouter().db_for_read(Event), "default")
+        finally:
+            db_router._use_replica.reset(token)
+
+    @override_settings(REPLICA_MAX_LAG=60)
+    def test_stale_sqlite_replica_is_skipped(self):
+        with tempfile.NamedTemporaryFile() as copy:
+            now = os.path.getmtime(copy.name)
+            self.assertTrue(db_router.sqlite_replica_fresh(copy.name, clock=lambda: now + 30))
+            self.assertFalse(db_router.sqlite_replica_fresh(copy.name, clock=lambda: now + 90))
+        self.assertFalse(db_router.sqlite_replica_fresh(copy.name))
+
+    @override_settings(REPLICA_STICKY_SECONDS=15, REPLICA_MAX_LAG=60)
+    def test_pin_outlasts_replica_lag(self):
+        middleware = db_router.ReplicaPinMiddleware(lambda request: HttpResponse(status=201))
+        with mock.patch.object(db_router.cache, "set") as pin:
+            middleware(self.request("post"))
+        pin.assert_called_once_with(f"db:pin:user:{self.user.pk}", True, 60)
@@ -4,6 +4,7 @@ from django.views import View
 from django.contrib.auth.decorators import login_required
 from django.contrib.admin.views.decorators import staff_member_required,user_passes_test
 from django.contrib.auth.models import User
+from ortho.db_router import read_replica
 import random 
 
 
@@ -13,6 +14,7 @@ def home_view(request):
     return render(request,'website/home.html')
 
 @user_passes_test(lambda u: u.is_superuser) 
+@read_replica
 def client_list_view(request):
     # Get all non-admin users
     clients = User.objects.filter(is_staff=False)